@@ -1,25 +1,112 @@
 import imaplib
 import email
-from email.header import decode_header
+import email.policy
+from email.parser import BytesHeaderParser
 import webbrowser
 import time
 import re
 import os
+import json
 import sys
+import select
+import socket
+import ssl
+import functools
+import base64
+import binascii
+import quopri
+import html
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import takewhile
+
+
+# --- Monitoring Constants ---
+# Socket timeout for connecting and for each blocking read, so a stalled
+# server surfaces as an error instead of hanging the monitor.
+SOCKET_TIMEOUT_SECONDS = 30
+# Re-issue IDLE every 9 minutes. RFC 2177 allows 29, but Gmail drops idle
+# sessions after about 10.
+IDLE_TIMEOUT_SECONDS = 9 * 60
+# How often an interruptible IDLE wait checks whether it should stop.
+IDLE_STOP_CHECK_SECONDS = 1.0
+# Send a NOOP on an otherwise quiet persistent connection to keep the session alive.
+NOOP_INTERVAL_SECONDS = 25 * 60
+# Upper bound for the exponential backoff between failed connection attempts.
+RECONNECT_MAX_DELAY_SECONDS = 15 * 60
+# Recently processed UIDs remembered in case the server re-delivers a message
+# before its \\Seen flag is visible. Older messages drop out of the UNSEEN search,
+# so only the most recent ones are kept to bound memory on long runs.
+PROCESSED_UID_HISTORY = 10_000
+# The same link arriving again within this window is not opened twice.
+RECENT_LINK_WINDOW_SECONDS = 60
+# UIDs per FETCH command, to stay under server request size limits.
+FETCH_BATCH_SIZE = 100
+CONFIG_FILE = "config.json"
+# Settings read from the config file and their defaults. None marks a required setting.
+CONFIG_DEFAULTS = {
+    "IMAP_SERVER": "imap.gmail.com",
+    "EMAIL_ACCOUNT": None,
+    "APP_PASSWORD": None,
+    "KEYWORD": None,
+    "POLL_INTERVAL_SECONDS": 30,
+    "MAILBOX": "Inbox",
+}
+# Older versions stored the settings as Python assignments in config.py
+LEGACY_CONFIG_FILE = "config.py"
+# Matches the KEY = 'text' / KEY = "text" / KEY = 123 lines old versions wrote to config.py
+_LEGACY_CONFIG_RE = re.compile(
+    r"""^\s*([A-Z_]+)\s*=\s*(?:'([^']*)'|"([^"]*)"|(-?\d+))\s*(?:#.*)?$""", re.M)
 
 
 # --- Logging Functions ---
+_log_timestamp_cache = [None, ""]  # [whole second, formatted timestamp]
+
+
+def _log_timestamp():
+    """Returns the current '%Y-%m-%d %H:%M:%S' timestamp, formatting it at most once per second."""
+    now = int(time.time())
+    if _log_timestamp_cache[0] != now:
+        _log_timestamp_cache[0] = now
+        _log_timestamp_cache[1] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))
+    return _log_timestamp_cache[1]
+
+
 def _console_log_message(message):
     """Default logger: Prints a message with a timestamp to the console."""
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}")
+    sys.stdout.write(f"[{_log_timestamp()}] {message}\n")
+
+
+def parse_legacy_configuration(text):
+    """Reads the key/value assignments of an old config.py without executing it."""
+    values = {}
+    for match in _LEGACY_CONFIG_RE.finditer(text):
+        key, single, double, number = match.groups()
+        if number is not None:
+            values[key] = int(number)
+        else:
+            values[key] = single if single is not None else double
+    return values
 
 
 # --- Email Connection Functions ---
+@functools.lru_cache(maxsize=1)
+def _get_ssl_context():
+    """Builds the TLS context on first connect and reuses it for reconnects.
+
+    Loading the CA bundle is deferred so importing this module (and starting the GUI)
+    doesn't pay for it.
+    """
+    return ssl.create_default_context()
+
+
 def connect_to_gmail(app_config, logger=_console_log_message):
     """Connects to Gmail IMAP server and logs in."""
     try:
         logger(f"Attempting to connect to {app_config['IMAP_SERVER']} for user {app_config['EMAIL_ACCOUNT']}...")
-        mail = imaplib.IMAP4_SSL(app_config['IMAP_SERVER'])
+        mail = imaplib.IMAP4_SSL(app_config['IMAP_SERVER'], ssl_context=_get_ssl_context(),
+                                 timeout=SOCKET_TIMEOUT_SECONDS)
+        _tune_socket(mail.sock)
         mail.login(app_config['EMAIL_ACCOUNT'], app_config['APP_PASSWORD'])
         logger(f"Successfully logged into {app_config['EMAIL_ACCOUNT']}")
         return mail
@@ -35,45 +122,198 @@ def connect_to_gmail(app_config, logger=_console_log_message):
         return None
 
 
+def _tune_socket(sock):
+    """Disables Nagle for the small IMAP command writes and lets the OS detect dead connections."""
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    except OSError:
+        pass
+
+
+def reconnect_delay(poll_interval, failures):
+    """Seconds to wait after ``failures`` consecutive failed connection attempts.
+
+    Starts at the poll interval and doubles per failure, up to
+    RECONNECT_MAX_DELAY_SECONDS (or the poll interval, if that is longer).
+    """
+    delay = poll_interval * 2 ** min(max(failures - 1, 0), 16)
+    return min(delay, max(poll_interval, RECONNECT_MAX_DELAY_SECONDS))
+
+
+def disconnect_from_gmail(mail, logger=_console_log_message):
+    """Closes the selected mailbox and logs out, ignoring an already dead connection.
+
+    The socket is shut down even if CLOSE or LOGOUT fails, so replacing a
+    broken connection doesn't leak it.
+    """
+    if not mail:
+        return
+    try:
+        mail.close()
+    except Exception as e:
+        logger(f"Error closing mailbox: {e}")
+    try:
+        mail.logout()
+        logger("Logged out from Gmail.")
+    except Exception as e:
+        logger(f"Error during logout: {e}")
+        # logout() only shuts the socket down once the server has answered
+        try:
+            mail.shutdown()
+        except Exception:
+            pass
+
+
 # --- Email Processing Functions ---
-def decode_subject(subject):
-    """Decodes email subject to handle different charsets."""
-    if not subject:
-        return ""
-        
-    decoded_parts = decode_header(subject)
-    decoded_subject_str = ''
-    for part, charset in decoded_parts:
-        if isinstance(part, bytes):
-            try:
-                decoded_subject_str += part.decode(charset or 'utf-8')
-            except UnicodeDecodeError:
-                decoded_subject_str += part.decode('latin-1', errors='replace')
-        else:
-            decoded_subject_str += part
-    return decoded_subject_str
+def supports_idle(mail):
+    """Returns True if the server advertised the IDLE capability."""
+    return 'IDLE' in (getattr(mail, 'capabilities', None) or ())
+
+
+def _idle_wait_native(mail, timeout, stop_event):
+    """idle_wait on Pythons whose imaplib has IMAP4.idle() (3.14+)."""
+    # Drop counts left over from earlier commands so only arrivals during IDLE count
+    mail.response('EXISTS')
+    mail.response('RECENT')
+    new_mail = False
+    with mail.idle(duration=timeout) as idler:
+        for response_type, _ in idler:
+            if response_type in ('EXISTS', 'RECENT'):
+                new_mail = True
+                break
+            if stop_event is not None and stop_event.is_set():
+                break
+    # New mail reported while IDLE was being ended is kept for response()
+    for response_type in ('EXISTS', 'RECENT'):
+        if mail.response(response_type)[1] != [None]:
+            new_mail = True
+    return new_mail
+
+
+def _has_buffered_response(mail):
+    """Returns True if response data is already buffered by imaplib or the TLS layer.
+
+    select() only sees bytes still waiting in the kernel, so a line that arrived
+    together with the previous one would otherwise sit unread until the next
+    packet. The peek is made non-blocking so an empty buffer doesn't wait.
+    """
+    timeout = mail.sock.gettimeout()
+    mail.sock.setblocking(False)
+    try:
+        return bool(mail.file.peek(1))
+    except (ssl.SSLWantReadError, BlockingIOError):
+        return False
+    finally:
+        mail.sock.settimeout(timeout)
+
+
+def idle_wait(mail, timeout, logger=_console_log_message, stop_event=None):
+    """Waits in IMAP IDLE until the server reports new mail or the timeout expires.
+
+    Returns True if an EXISTS/RECENT notification arrived, False on timeout.
+    The currently selected mailbox is the one being watched. If a
+    threading.Event is given as ``stop_event``, setting it ends the wait
+    within IDLE_STOP_CHECK_SECONDS. With imaplib's own IDLE support the event
+    is only checked between responses, so callers that need to stop promptly
+    also shut the socket down (as the GUI does).
+
+    imaplib only gained IMAP4.idle() in Python 3.14. Older versions fall back
+    to driving IDLE by hand, which relies on imaplib internals that 3.11-3.13
+    provide: _new_tag(), tagged_commands, send()/readline() and the buffered
+    ``file`` that _has_buffered_response peeks into.
+    """
+    if hasattr(imaplib.IMAP4, 'idle'):
+        new_mail = _idle_wait_native(mail, timeout, stop_event)
+        if new_mail:
+            logger("New mail notification received.")
+        return new_mail
+
+    tag = mail._new_tag()
+    mail.send(tag + b' IDLE\r\n')
+    response = mail.readline()
+    if not response.startswith(b'+'):
+        raise imaplib.IMAP4.error(f"Server rejected IDLE: {response.strip().decode(errors='replace')}")
+
+    new_mail = False
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (stop_event is not None and stop_event.is_set()):
+            break
+        if stop_event is not None:
+            remaining = min(remaining, IDLE_STOP_CHECK_SECONDS)
+        if not _has_buffered_response(mail):
+            readable, _, _ = select.select([mail.sock], [], [], remaining)
+            if not readable:
+                continue
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed by server during IDLE")
+        if line.rstrip().endswith((b'EXISTS', b'RECENT')):
+            new_mail = True
+            break
+
+    # End IDLE and consume everything up to the tagged completion response,
+    # including any new mail reported while IDLE was being ended
+    mail.send(b'DONE\r\n')
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed by server while ending IDLE")
+        if line.startswith(tag):
+            break
+        if line.rstrip().endswith((b'EXISTS', b'RECENT')):
+            new_mail = True
+    # _new_tag() registered the tag, but the completion was read here rather than by imaplib
+    mail.tagged_commands.pop(tag, None)
+    if new_mail:
+        logger("New mail notification received.")
+    return new_mail
+
+
+@functools.lru_cache(maxsize=8)
+def build_search_criteria(keyword):
+    """Builds the SEARCH criteria for unread emails with the keyword in subject or body.
+
+    The keyword only changes with the configuration, so the string is built
+    once per keyword instead of on every poll.
+    """
+    quoted = '"' + keyword.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return f'(UNSEEN OR SUBJECT {quoted} BODY {quoted})'
 
 
 def search_emails(mail, app_config, logger=_console_log_message):
-    """Searches for emails with a specific keyword in subject or body."""
+    """Searches for unread emails with a specific keyword in subject or body.
+
+    Returns a list of message UIDs. Processed emails are marked as read, so
+    they drop out of subsequent searches on their own.
+    """
+    return _search_email_uids(mail, app_config, logger) or []
+
+
+def _search_email_uids(mail, app_config, logger):
+    """Does the work of search_emails, returning None instead of [] when the search failed."""
     keyword = app_config['KEYWORD']
     mailbox = app_config.get('MAILBOX', "Inbox")
     
     try:
-        logger(f"Selecting mailbox: '{mailbox}'")
-        status, messages = mail.select(mailbox)
-        if status != 'OK':
-            logger(f"Error selecting mailbox {mailbox}: {status}")
-            return []
-
-        # Search for unread emails with keyword in subject or body
-        search_criteria = f'(OR (UNSEEN SUBJECT "{keyword}" BODY "{keyword}") (SUBJECT "{keyword}" BODY "{keyword}"))'
+        # A persistent connection stays in the selected mailbox, so only SELECT once
+        if getattr(mail, '_selected_mailbox', None) != mailbox:
+            logger(f"Selecting mailbox: '{mailbox}'")
+            status, messages = mail.select(mailbox)
+            if status != 'OK':
+                logger(f"Error selecting mailbox {mailbox}: {status}")
+                return None
+            mail._selected_mailbox = mailbox
+
+        search_criteria = build_search_criteria(keyword)
         logger(f"Searching with criteria: {search_criteria}")
         
-        status, email_ids_data = mail.search(None, search_criteria)
+        status, email_ids_data = mail.uid('SEARCH', None, search_criteria)
         if status != 'OK':
             logger(f"Error searching emails: {status}")
-            return []
+            return None
 
         email_ids = email_ids_data[0].split()
         count = len(email_ids)
@@ -84,37 +324,274 @@ def search_emails(mail, app_config, logger=_console_log_message):
         return email_ids
     except Exception as e:
         logger(f"Error searching emails: {e}")
+        return None
+
+
+def has_new_messages(mail):
+    """Sends a NOOP and returns True if the server reported new messages since the last call.
+
+    NOOP is how a client picks up updates for the selected mailbox (STATUS
+    should not be used on it). imaplib keeps the untagged EXISTS responses of
+    every command until they are read, so any arrival since the previous call
+    is seen here.
+    """
+    mail.noop()
+    _, counts = mail.response('EXISTS')
+    return counts != [None]
+
+
+# --- Partial Fetch Functions ---
+_IMAP_TOKEN_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}\r\n|([^\s()"]+))')
+_FETCH_SECTION_RE = re.compile(rb'BODY\[([^\]]*)\](?:<\d+>)? \{\d+\}$')
+# policy.default decodes RFC 2047 encoded words in the parsed Subject/From headers
+_HEADER_PARSER = BytesHeaderParser(policy=email.policy.default)
+_FETCH_START_RE = re.compile(rb'^\d+ \(')
+_FETCH_UID_RE = re.compile(rb'\bUID (\d+)')
+_URL_RE = re.compile(r'https?://[^\s"\'<>\[\]]+')
+
+
+def _join_fetch_response(data):
+    """Reassembles an imaplib FETCH response, re-inlining literal strings."""
+    chunks = []
+    for item in data:
+        if isinstance(item, tuple):
+            chunks.append(item[0] + b'\r\n' + item[1])
+        elif item:
+            chunks.append(item)
+    return b''.join(chunks)
+
+
+def _parse_imap_list(data):
+    """Parses a parenthesized IMAP response into nested lists of bytes (NIL becomes None)."""
+    stack = [[]]
+    pos = 0
+    while True:
+        match = _IMAP_TOKEN_RE.match(data, pos)
+        if not match:
+            break
+        pos = match.end()
+        open_paren, close_paren, quoted, literal_size, atom = match.groups()
+        if open_paren:
+            stack.append([])
+        elif close_paren:
+            if len(stack) == 1:
+                break
+            closed = stack.pop()
+            stack[-1].append(closed)
+        elif quoted is not None:
+            stack[-1].append(re.sub(rb'\\(.)', rb'\1', quoted))
+        elif literal_size is not None:
+            size = int(literal_size)
+            stack[-1].append(data[pos:pos + size])
+            pos += size
+        else:
+            stack[-1].append(None if atom.upper() == b'NIL' else atom)
+    return stack[0]
+
+
+def _find_text_sections(structure, section=''):
+    """Returns (section, subtype, encoding, charset) for each inline text/plain or text/html part of a BODYSTRUCTURE."""
+    if isinstance(structure[0], list):
+        sections = []
+        children = takewhile(lambda child: isinstance(child, list), structure)
+        for index, child in enumerate(children, start=1):
+            child_section = f"{section}.{index}" if section else str(index)
+            sections.extend(_find_text_sections(child, child_section))
+        return sections
+
+    main_type = (structure[0] or b'').lower()
+    sub_type = (structure[1] or b'').lower()
+    if main_type != b'text' or sub_type not in (b'plain', b'html'):
         return []
 
+    # text parts: type subtype params id description encoding size lines md5 disposition ...
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and disposition and (disposition[0] or b'').lower() == b'attachment':
+        return []
+
+    params = structure[2] if isinstance(structure[2], list) else []
+    charset = None
+    for name, value in zip(params[::2], params[1::2]):
+        if name and name.lower() == b'charset' and value:
+            charset = value.decode('ascii', errors='replace')
+    encoding = (structure[5] or b'7bit').lower()
+    return [(section or '1', sub_type, encoding, charset)]
+
+
+def _prefer_plain_text(sections):
+    """Drops the text/html parts when a text/plain part is available.
+
+    The HTML alternative is normally a larger rendering of the same text, so it
+    is only fetched and scanned for emails that have no plain text part.
+    """
+    plain_sections = [part for part in sections if part[1] == b'plain']
+    return plain_sections or sections
+
+
+def _decode_transfer_encoding(data, encoding):
+    """Undoes the Content-Transfer-Encoding of a fetched body part."""
+    try:
+        if encoding == b'base64':
+            return base64.b64decode(data)
+        if encoding == b'quoted-printable':
+            return quopri.decodestring(data)
+    except (binascii.Error, ValueError):
+        pass
+    return data
+
+
+def _decode_charset(data, charset):
+    """Decodes body bytes in one pass using the declared charset (UTF-8 if none).
+
+    Invalid bytes are replaced rather than retried in another charset; links
+    are ASCII, so they survive either way. Unknown charset names fall back to latin-1.
+    """
+    try:
+        return data.decode(charset or 'utf-8', errors='replace')
+    except LookupError:
+        return data.decode('latin-1', errors='replace')
+
+
+def _as_uid_bytes(email_id):
+    """Normalizes a UID to the bytes form used in IMAP responses."""
+    return email_id if isinstance(email_id, bytes) else str(email_id).encode()
+
+
+def _uid_set(uids):
+    """Builds a compact IMAP UID set, e.g. [b'1', b'4', b'9', b'10', b'11'] -> b'1,4,9:11'."""
+    ranges = []
+    for uid in sorted({int(uid) for uid in uids}):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return b','.join(b'%d' % first if first == last else b'%d:%d' % (first, last)
+                     for first, last in ranges)
+
+
+def _parse_body_structures(structure_data):
+    """Maps each UID in a batched BODYSTRUCTURE response to its text sections."""
+    structures = {}
+    for item in _parse_imap_list(_join_fetch_response(structure_data)):
+        if not isinstance(item, list):
+            continue
+        attributes = dict(zip(item[::2], item[1::2]))
+        uid = attributes.get(b'UID')
+        structure = attributes.get(b'BODYSTRUCTURE')
+        if uid and isinstance(structure, list):
+            structures[uid] = _prefer_plain_text(_find_text_sections(structure))
+    return structures
+
+
+def _parse_fetched_sections(msg_data_raw):
+    """Maps each UID in a batched FETCH response to its {section: bytes} data."""
+    messages = {}
+    sections = {}
+    for response_part in msg_data_raw:
+        preamble = response_part[0] if isinstance(response_part, tuple) else response_part
+        if not preamble:
+            continue
+        if _FETCH_START_RE.match(preamble):
+            sections = {}
+        uid_match = _FETCH_UID_RE.search(preamble)
+        if uid_match:
+            messages[uid_match.group(1)] = sections
+        if isinstance(response_part, tuple):
+            section_match = _FETCH_SECTION_RE.search(preamble)
+            if section_match:
+                sections[section_match.group(1).decode()] = response_part[1]
+    return messages
+
+
+def _build_email_text(fetched_sections, text_sections):
+    """Turns fetched header/body sections into (headers, [decoded_text, ...])."""
+    header_bytes = next((data for section, data in fetched_sections.items()
+                         if section.upper().startswith('HEADER')), b'')
+    headers = _HEADER_PARSER.parsebytes(header_bytes)
+    bodies = []
+    for section, sub_type, encoding, charset in text_sections:
+        if section not in fetched_sections:
+            continue
+        body = _decode_transfer_encoding(fetched_sections[section], encoding)
+        text = _decode_charset(body, charset)
+        if sub_type == b'html':
+            # Links in href attributes carry entities such as &amp; in their query strings.
+            text = html.unescape(text)
+        bodies.append(text)
+    return headers, bodies
+
+
+def _fetch_text_batch(mail, uids, logger):
+    """Fetches the headers and text parts of one batch of UIDs for fetch_emails_text."""
+    status, structure_data = mail.uid('FETCH', _uid_set(uids), '(UID BODYSTRUCTURE)')
+    if status != 'OK' or not structure_data or structure_data[0] is None:
+        logger(f"Error fetching message structure: {status}")
+        return {}
+    structures = _parse_body_structures(structure_data)
+
+    uids_by_layout = {}
+    for uid in uids:
+        if uid in structures:
+            layout = tuple(part[0] for part in structures[uid])
+            uids_by_layout.setdefault(layout, []).append(uid)
+
+    results = {}
+    for layout, layout_uids in uids_by_layout.items():
+        fetch_items = ['UID', 'BODY.PEEK[HEADER.FIELDS (SUBJECT FROM)]']
+        fetch_items.extend(f'BODY.PEEK[{section}]' for section in layout)
+        status, msg_data_raw = mail.uid('FETCH', _uid_set(layout_uids), f"({' '.join(fetch_items)})")
+        if status != 'OK':
+            logger(f"Error fetching emails: {status}")
+            continue
+        for uid, fetched_sections in _parse_fetched_sections(msg_data_raw).items():
+            if uid in structures:
+                results[uid] = _build_email_text(fetched_sections, structures[uid])
+    return results
+
+
+def fetch_emails_text(mail, email_ids, logger=_console_log_message, batch_size=FETCH_BATCH_SIZE):
+    """Fetches only the Subject/From headers and the inline text parts of several emails.
+
+    Uses one BODYSTRUCTURE request per batch of UIDs to locate the text/plain
+    part (or text/html when there is none), so attachments and HTML
+    alternatives are never downloaded, then one BODY.PEEK request per distinct
+    part layout (usually a single round-trip). BODY.PEEK does not set the
+    \\Seen flag. A batch the server rejects is retried one UID at a time.
+    Returns {uid: (headers, [decoded_text, ...])} for every email that could
+    be fetched.
+    """
+    uids = [_as_uid_bytes(email_id) for email_id in email_ids]
+    results = {}
+    for start in range(0, len(uids), batch_size):
+        batch = uids[start:start + batch_size]
+        try:
+            results.update(_fetch_text_batch(mail, batch, logger))
+        except imaplib.IMAP4.abort:
+            raise
+        except imaplib.IMAP4.error as e:
+            # e.g. "BAD parse error: maximum request size exceeded"
+            logger(f"Error fetching emails: {e}")
+            if len(batch) > 1:
+                results.update(fetch_emails_text(mail, batch, logger, batch_size=1))
+    return results
+
+
+def fetch_email_text(mail, email_id, logger=_console_log_message):
+    """Fetches the headers and inline text parts of a single email, or None on failure."""
+    return fetch_emails_text(mail, [email_id], logger).get(_as_uid_bytes(email_id))
+
 
-def extract_link_from_email(msg_data, logger=_console_log_message):
-    """Extracts the first HTTP/HTTPS link from the email body."""
-    for part in msg_data.walk():
-        content_type = part.get_content_type()
-        content_disposition = str(part.get("Content-Disposition"))
-
-        if "attachment" not in content_disposition:
-            if content_type in ("text/plain", "text/html"):
-                try:
-                    body = part.get_payload(decode=True).decode()
-                except UnicodeDecodeError:
-                    try:
-                        body = part.get_payload(decode=True).decode('latin-1', errors='replace')
-                    except Exception as e_decode:
-                        logger(f"Could not decode email part ({content_type}): {e_decode}")
-                        continue 
-                
-                url_match = re.search(r'https?://[^\s"\'<>\[\]]+', body)
-                if url_match:
-                    return url_match.group(0)
-    return None
+def extract_link_from_text(text):
+    """Returns the first HTTP/HTTPS link in a decoded text body, or None."""
+    url_match = _URL_RE.search(text)
+    return url_match.group(0) if url_match else None
 
 
 def mark_as_read(mail, email_id, app_config, logger=_console_log_message):
-    """Marks an email as read (seen)."""
+    """Marks an email as read (seen) by UID."""
     mailbox = app_config.get('MAILBOX', "Inbox")
     try:
-        mail.store(email_id, '+FLAGS', '\\Seen')
+        mail.uid('STORE', email_id, '+FLAGS', '\\Seen')
         id_str = email_id.decode() if isinstance(email_id, bytes) else email_id
         logger(f"Marked email ID {id_str} as read in {mailbox}.")
     except Exception as e:
@@ -122,8 +599,76 @@ def mark_as_read(mail, email_id, app_config, logger=_console_log_message):
         logger(f"Error marking email ID {id_str} as read: {e}")
 
 
-def open_link_in_browser(link, logger=_console_log_message):
-    """Opens a link in the default web browser."""
+def mark_emails_as_read(mail, email_ids, app_config, logger=_console_log_message):
+    """Marks several emails as read with a single UID STORE instead of one round-trip each."""
+    if not email_ids:
+        return
+    if len(email_ids) == 1:
+        mark_as_read(mail, email_ids[0], app_config, logger)
+        return
+    mailbox = app_config.get('MAILBOX', "Inbox")
+    uid_set = _uid_set(email_ids)
+    try:
+        mail.uid('STORE', uid_set, '+FLAGS', '\\Seen')
+        logger(f"Marked {len(email_ids)} emails as read in {mailbox}: {uid_set.decode()}.")
+    except Exception as e:
+        logger(f"Error marking emails {uid_set.decode()} as read: {e}")
+
+
+class ProcessedUids:
+    """The most recently processed UIDs, forgetting the oldest beyond ``maxsize``.
+
+    UIDs may be given as bytes, str or int and are stored as ints.
+    """
+
+    def __init__(self, maxsize=PROCESSED_UID_HISTORY):
+        self.maxsize = maxsize
+        self._uids = OrderedDict()
+
+    def __contains__(self, email_id):
+        uid = int(email_id)
+        if uid in self._uids:
+            self._uids.move_to_end(uid)
+            return True
+        return False
+
+    def __len__(self):
+        return len(self._uids)
+
+    def __iter__(self):
+        return iter(self._uids)
+
+    def add(self, email_id):
+        uid = int(email_id)
+        self._uids[uid] = None
+        self._uids.move_to_end(uid)
+        if len(self._uids) > self.maxsize:
+            self._uids.popitem(last=False)
+
+    def clear(self):
+        self._uids.clear()
+
+
+# webbrowser.open can block while the browser starts, so links are opened on
+# a single background thread and the caller moves on to the next email.
+_BROWSER_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="browser")
+# Links opened recently, as (link, time.monotonic()) pairs, oldest first.
+_recent_links = deque()
+
+
+def _is_recently_opened(link):
+    """Returns True if the link was opened within RECENT_LINK_WINDOW_SECONDS, else records it."""
+    now = time.monotonic()
+    while _recent_links and now - _recent_links[0][1] > RECENT_LINK_WINDOW_SECONDS:
+        _recent_links.popleft()
+    if any(recent_link == link for recent_link, _ in _recent_links):
+        return True
+    _recent_links.append((link, now))
+    return False
+
+
+def _open_link(link, logger):
+    """Opens the link in a new browser tab; runs on the browser thread."""
     try:
         webbrowser.open(link, new=2)
         logger(f"Successfully opened link: {link}")
@@ -131,27 +676,46 @@ def open_link_in_browser(link, logger=_console_log_message):
         logger(f"Error opening link {link} in browser: {e}")
 
 
+def open_link_in_browser(link, logger=_console_log_message):
+    """Opens a link in the default web browser without waiting for it.
+
+    Returns the Future of the background open, or None if the same link was
+    already opened moments ago (e.g. a burst of duplicate notifications).
+    """
+    if _is_recently_opened(link):
+        logger(f"Link already opened recently, skipping: {link}")
+        return None
+    return _BROWSER_POOL.submit(_open_link, link, logger)
+
+
 # --- Main Function ---
 def main():
     """Standalone execution of email monitor script."""
-    try:
-        import config as config_module
-    except ImportError:
-        _console_log_message("Error: Configuration file (config.py) not found.")
-        _console_log_message("Please ensure config.py exists with your Gmail credentials and settings.")
-        sys.exit(1)
-
-    # Create a dictionary from the config module
-    current_config = {
-        key: getattr(config_module, key) 
-        for key in dir(config_module) 
-        if not key.startswith('_') and hasattr(config_module, key)
-    }
-    
-    # Set default values if missing
-    current_config.setdefault("IMAP_SERVER", "imap.gmail.com")
-    current_config.setdefault("MAILBOX", "Inbox")
-    current_config.setdefault("POLL_INTERVAL_SECONDS", 30)
+    # Read only the known settings, falling back to the defaults for missing ones
+    if os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                stored_config = json.load(f)
+        except (OSError, ValueError) as e:
+            _console_log_message(f"Error: Could not read {CONFIG_FILE}: {e}")
+            sys.exit(1)
+        current_config = {
+            key: stored_config.get(key, default)
+            for key, default in CONFIG_DEFAULTS.items()
+        }
+    else:
+        # Legacy config.py, until the GUI migrates it to config.json
+        try:
+            with open(LEGACY_CONFIG_FILE, 'r') as f:
+                legacy_values = parse_legacy_configuration(f.read())
+        except OSError:
+            _console_log_message(f"Error: Configuration file ({CONFIG_FILE}) not found.")
+            _console_log_message("Please run gui_app.py once to create it with your Gmail credentials and settings.")
+            sys.exit(1)
+        current_config = {
+            key: legacy_values.get(key, default)
+            for key, default in CONFIG_DEFAULTS.items()
+        }
 
     # Validate required settings
     missing_settings = []
@@ -163,7 +727,7 @@ def main():
         missing_settings.append("KEYWORD")
     
     if missing_settings:
-        _console_log_message(f"CRITICAL: Please set these values in config.py: {', '.join(missing_settings)}")
+        _console_log_message(f"CRITICAL: Please set these values in {CONFIG_FILE}: {', '.join(missing_settings)}")
         sys.exit(1)
 
     _console_log_message("Email Monitor Script - Starting up...")
@@ -171,7 +735,7 @@ def main():
     _console_log_message(f"Polling interval: {current_config['POLL_INTERVAL_SECONDS']} seconds.")
     _console_log_message("Press Ctrl+C to stop the script.")
 
-    processed_email_ids = set()
+    processed_email_ids = ProcessedUids()
 
     try:
         monitor_emails(current_config, processed_email_ids)
@@ -185,104 +749,146 @@ def main():
 
 
 def monitor_emails(config, processed_email_ids):
-    """Core email monitoring loop."""
-    while True:
-        mail = None
-        try:
-            mail = connect_to_gmail(config, _console_log_message)
-            if not mail:
-                _console_log_message(f"Failed to connect. Retrying in {config['POLL_INTERVAL_SECONDS']} seconds...")
-                time.sleep(config['POLL_INTERVAL_SECONDS'])
+    """Core email monitoring loop.
+
+    Keeps a single IMAP connection open for the lifetime of the loop and only
+    reconnects after a connection error. Uses IMAP IDLE to wait for new mail
+    when the server supports it, otherwise polls every POLL_INTERVAL_SECONDS.
+    """
+    mail = None
+    # Failed connects and aborted connections since the last successful check
+    failures = 0
+    last_activity = time.monotonic()
+    # Whether the last poll handled every email it found, see check_for_new_emails
+    mailbox_state = {}
+    try:
+        while True:
+            try:
+                if mail is None:
+                    mail = connect_to_gmail(config, _console_log_message)
+                    if not mail:
+                        failures += 1
+                        delay = reconnect_delay(config['POLL_INTERVAL_SECONDS'], failures)
+                        _console_log_message(f"Failed to connect. Retrying in {delay} seconds...")
+                        time.sleep(delay)
+                        continue
+                elif time.monotonic() - last_activity > NOOP_INTERVAL_SECONDS:
+                    mail.noop()
+
+                if supports_idle(mail):
+                    _console_log_message("Server supports IDLE. Waiting for new mail notifications.")
+                    while True:
+                        # IDLE itself reports new mail, so every check here searches.
+                        # Emails left unhandled are retried when IDLE times out.
+                        handled_all = check_for_new_emails(mail, config, processed_email_ids)
+                        failures = 0
+                        while not idle_wait(mail, IDLE_TIMEOUT_SECONDS, _console_log_message) and handled_all:
+                            _console_log_message("IDLE timeout reached. Re-issuing IDLE.")
+                else:
+                    check_for_new_emails(mail, config, processed_email_ids, mailbox_state)
+                    failures = 0
+                last_activity = time.monotonic()
+
+            except (imaplib.IMAP4.abort, OSError) as e:
+                disconnect_from_gmail(mail, _console_log_message)
+                mail = None
+                # A connection that was working is replaced at once. If it drops again
+                # before a check succeeds (e.g. on SELECT), back off as for failed connects.
+                if failures:
+                    delay = reconnect_delay(config['POLL_INTERVAL_SECONDS'], failures)
+                    _console_log_message(f"Connection lost: {e}. Reconnecting in {delay} seconds...")
+                    time.sleep(delay)
+                else:
+                    _console_log_message(f"Connection lost: {e}. Reconnecting...")
+                failures += 1
                 continue
-
-            email_ids = search_emails(mail, config, _console_log_message)
-            if not email_ids:
-                _console_log_message("No new emails found. Waiting...")
+            except Exception as e:
+                _console_log_message(f"Error in monitoring loop: {e}")
             
-            for e_id in reversed(email_ids):
-                if e_id in processed_email_ids:
-                    continue
-
-                process_email(mail, e_id, config, processed_email_ids)
-                
-        except Exception as e:
-            _console_log_message(f"Error in monitoring loop: {e}")
-        finally:
-            if mail:
-                try:
-                    mail.close()
-                    mail.logout()
-                    _console_log_message("Logged out from Gmail.")
-                except Exception as e_logout:
-                    _console_log_message(f"Error during logout: {e_logout}")
-        
-        _console_log_message(f"Waiting for {config['POLL_INTERVAL_SECONDS']} seconds...")
-        time.sleep(config['POLL_INTERVAL_SECONDS'])
-
-
-def process_email(mail, e_id, config, processed_email_ids):
-    """Process a single email."""
+            _console_log_message(f"Waiting for {config['POLL_INTERVAL_SECONDS']} seconds...")
+            time.sleep(config['POLL_INTERVAL_SECONDS'])
+    finally:
+        disconnect_from_gmail(mail, _console_log_message)
+
+
+def check_for_new_emails(mail, config, processed_email_ids, mailbox_state=None):
+    """Searches the mailbox once and processes any new matching emails.
+
+    All new emails are fetched in a single batch instead of one round-trip each.
+    When ``mailbox_state`` is given and the previous call handled everything it
+    found, the search is skipped unless a NOOP shows that new messages arrived.
+    Returns True if the search succeeded and every new email was handled.
+    """
+    if mailbox_state is not None:
+        mailbox = config.get('MAILBOX', "Inbox")
+        if (mailbox_state.get('handled_all') and getattr(mail, '_selected_mailbox', None) == mailbox
+                and not has_new_messages(mail)):
+            _console_log_message("No new emails found. Waiting...")
+            return True
+        # Until this check completes, the next one has to search again
+        mailbox_state['handled_all'] = False
+        # Drop the arrivals this search is about to cover
+        mail.response('EXISTS')
+
+    email_ids = _search_email_uids(mail, config, _console_log_message)
+    if email_ids is None:
+        return False
+    if not email_ids:
+        _console_log_message("No new emails found. Waiting...")
+    
+    new_email_ids = [e_id for e_id in reversed(email_ids) if e_id not in processed_email_ids]
+    handled_ids = []
+    if new_email_ids:
+        fetched_emails = fetch_emails_text(mail, new_email_ids, _console_log_message)
+        handled_ids = [e_id for e_id in new_email_ids
+                       if process_email(mail, e_id, config, processed_email_ids,
+                                        fetched_emails.get(_as_uid_bytes(e_id)), mark_read=False)]
+        mark_emails_as_read(mail, handled_ids, config, _console_log_message)
+
+    handled_all = len(handled_ids) == len(new_email_ids)
+    if mailbox_state is not None:
+        mailbox_state['handled_all'] = handled_all
+    return handled_all
+
+
+def process_email(mail, e_id, config, processed_email_ids, fetched=None, mark_read=True):
+    """Process a single email, downloading only its headers and text parts.
+
+    ``fetched`` is the (headers, bodies) pair from fetch_emails_text when the
+    email was already fetched as part of a batch. With ``mark_read=False`` the
+    caller marks it as read, e.g. together with the rest of the batch.
+    Returns True if the email was processed.
+    """
     e_id_str = e_id.decode() if isinstance(e_id, bytes) else e_id
-    status, msg_data_raw = mail.fetch(e_id, '(RFC822)')
+    if fetched is None:
+        fetched = fetch_email_text(mail, e_id, _console_log_message)
     
-    if status != 'OK':
+    if fetched is None:
         _console_log_message(f"Failed to fetch email ID {e_id_str}")
-        return
-        
-    for response_part in msg_data_raw:
-        if not isinstance(response_part, tuple):
-            continue
-            
-        msg = email.message_from_bytes(response_part[1])
-        subject = decode_subject(msg['subject'])
-        from_ = msg.get('From')
-        _console_log_message(f"Processing ID {e_id_str}: From: {from_}, Subject: {subject}")
-
-        keyword_in_subject = config['KEYWORD'].lower() in subject.lower()
-        link = None
-        keyword_in_body = False
+        return False
         
-        for part in msg.walk():
-            if part.get_content_type() in ["text/plain", "text/html"] and \
-               "attachment" not in str(part.get("Content-Disposition")):
-                body_content = get_decoded_content(part)
-                if not body_content:
-                    continue
-                    
-                if config['KEYWORD'].lower() in body_content.lower():
-                    keyword_in_body = True
-                
-                if not link:
-                    url = extract_link_from_email(msg, _console_log_message)
-                    if url: 
-                        link = url
-                
-                if link and keyword_in_body:
-                    break
+    headers, bodies = fetched
+    subject = headers['subject'] or ""
+    from_ = headers.get('From')
+    _console_log_message(f"Processing ID {e_id_str}: From: {from_}, Subject: {subject}")
+
+    # search_emails already matched the keyword server-side, so only the link is needed
+    link = None
+    for body_content in bodies:
+        link = extract_link_from_text(body_content)
+        if link:
+            break
+    
+    if link:
+        _console_log_message(f"Found link in email ID {e_id_str}: {link}")
+        open_link_in_browser(link, _console_log_message)
+    else:
+        _console_log_message(f"Keyword found in ID {e_id_str}, but no link extracted.")
+    if mark_read:
+        mark_as_read(mail, e_id, config, _console_log_message)
         
-        if keyword_in_subject or keyword_in_body:
-            if link:
-                _console_log_message(f"Found link in email ID {e_id_str}: {link}")
-                open_link_in_browser(link, _console_log_message)
-                mark_as_read(mail, e_id, config, _console_log_message)
-            else:
-                _console_log_message(f"Keyword found in ID {e_id_str}, but no link extracted.")
-                mark_as_read(mail, e_id, config, _console_log_message)
-        else:
-            _console_log_message(f"Keyword not found in ID {e_id_str} after fetch. Skipping.")
-            
-        processed_email_ids.add(e_id)
-
-
-def get_decoded_content(part):
-    """Helper to decode email content handling encoding issues."""
-    try:
-        return part.get_payload(decode=True).decode()
-    except UnicodeDecodeError:
-        try:
-            return part.get_payload(decode=True).decode('latin-1', errors='replace')
-        except Exception:
-            return None
+    processed_email_ids.add(e_id)
+    return True
 
 
 if __name__ == "__main__":
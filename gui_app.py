@@ -1,11 +1,14 @@
 import tkinter as tk
 from tkinter import ttk, simpledialog, messagebox as tk_messagebox  # Import as tk_messagebox for test compatibility
 import os
+import io
+import base64
+import json
 import threading
 import time
 import queue
+import socket
 import sys
-from unittest.mock import MagicMock
 
 # --- Handle optional dependencies gracefully ---
 try:
@@ -20,14 +23,19 @@ except ImportError:
 from email_monitor import (
     connect_to_gmail,
     search_emails,
-    decode_subject,
-    extract_link_from_email,
+    fetch_emails_text,
+    supports_idle,
+    idle_wait,
+    IDLE_TIMEOUT_SECONDS,
+    NOOP_INTERVAL_SECONDS,
+    reconnect_delay,
+    extract_link_from_text,
     open_link_in_browser,
-    mark_as_read,
-    get_decoded_content,
+    mark_emails_as_read,
+    ProcessedUids,
+    parse_legacy_configuration,
 )
 import imaplib
-import email
 
 
 # --- Alias functions for test compatibility ---
@@ -38,7 +46,11 @@ def em_search_emails(mail, app_config, logger=None):
 
 
 # --- Configuration Constants ---
-CONFIG_FILE = "config.py"
+CONFIG_FILE = "config.json"
+# Older versions stored the settings as Python assignments in config.py
+LEGACY_CONFIG_FILE = "config.py"
+# Where config.py is kept after it has been converted
+LEGACY_CONFIG_BACKUP = LEGACY_CONFIG_FILE + ".bak"
 DEFAULT_CONFIG = {
     "IMAP_SERVER": "imap.gmail.com",
     "EMAIL_ACCOUNT": "YOUR_EMAIL@gmail.com",
@@ -49,46 +61,104 @@ DEFAULT_CONFIG = {
 }
 
 
+# --- Log Display Constants ---
+# Oldest lines are dropped beyond this so a long-running monitor doesn't grow the log widget forever
+MAX_LOG_LINES = 2000
+
+
+# --- Tray Icon Constants ---
+ICON_FILE = "icon.png"
+# Plain blue 64x64 PNG used when ICON_FILE is missing, so no image has to be generated or written
+_DEFAULT_ICON_PNG_B64 = (
+    "iVBORw0KGgoAAAANSUhEUgAAAEAAAABACAIAAAAlC+aJAAAAS0lEQVR42u3PQQkAAAgAsetfWiP4FgYrsGqeExAQ"
+    "EBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBAQEBA4LMf88OL0EKXAAAAAAElFTkSuQmCC"
+)
+
+
 # --- Configuration Management ---
+# Last successfully loaded config, keyed by the file's (mtime, size)
+_CONFIG_CACHE = {'key': None, 'data': None}
+
+
+def _config_file_key():
+    """Returns (mtime_ns, size) of the config file, or None if it can't be read."""
+    try:
+        st = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _write_config_file(config_data):
+    """Write config.json atomically
+
+    The JSON is written to a temporary file in one write and then moved over
+    config.json, so a crash mid-save never leaves a truncated config behind.
+    """
+    temp_file = CONFIG_FILE + ".tmp"
+    content = json.dumps({key: config_data[key] for key in DEFAULT_CONFIG}, indent=2)
+    with open(temp_file, 'w') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, CONFIG_FILE)
+    # A rewrite within the mtime resolution could otherwise keep serving the old config
+    _CONFIG_CACHE['key'] = None
+
+
+def _migrate_legacy_configuration():
+    """One-time conversion of an old config.py into config.json
+
+    The old file is kept as config.py.bak. If a required setting can't be read
+    from it (e.g. a computed or escaped value), nothing is converted and the
+    file is left in place, so the credentials are never lost.
+    """
+    try:
+        with open(LEGACY_CONFIG_FILE, 'r') as f:
+            legacy_values = parse_legacy_configuration(f.read())
+        missing = [key for key in ("EMAIL_ACCOUNT", "APP_PASSWORD", "KEYWORD") if key not in legacy_values]
+        if missing:
+            print(f"Not migrating {LEGACY_CONFIG_FILE}: could not read {', '.join(missing)}. "
+                  f"Enter the settings in the setup wizard instead.")
+            return
+        config = {key: legacy_values.get(key, default) for key, default in DEFAULT_CONFIG.items()}
+        _write_config_file(config)
+        os.replace(LEGACY_CONFIG_FILE, LEGACY_CONFIG_BACKUP)
+        print(f"Migrated {LEGACY_CONFIG_FILE} to {CONFIG_FILE} (old file kept as {LEGACY_CONFIG_BACKUP})")
+    except Exception as e:
+        print(f"Error migrating {LEGACY_CONFIG_FILE} to {CONFIG_FILE}: {e}")
+
+
 def load_configuration():
-    """Load application configuration from config.py file"""
+    """Load application configuration from config.json file
+
+    The parsed file is cached until its modification time or size changes.
+    """
+    if not os.path.exists(CONFIG_FILE) and os.path.exists(LEGACY_CONFIG_FILE):
+        _migrate_legacy_configuration()
+
     config = DEFAULT_CONFIG.copy()
     if os.path.exists(CONFIG_FILE):
+        file_key = _config_file_key()
+        if file_key is not None and file_key == _CONFIG_CACHE['key']:
+            return dict(_CONFIG_CACHE['data'])
         try:
-            global_vars = {}
             with open(CONFIG_FILE, 'r') as f:
-                exec(f.read(), global_vars)
+                stored_config = json.load(f)
             for key in config:
-                if key in global_vars:
-                    config[key] = global_vars[key]
+                if key in stored_config:
+                    config[key] = stored_config[key]
+            _CONFIG_CACHE['key'] = file_key
+            _CONFIG_CACHE['data'] = dict(config)
         except Exception as e:
             print(f"Error loading {CONFIG_FILE}: {e}")
     return config
 
 
 def save_configuration(config_data):
-    """Save configuration to config.py file"""
+    """Save configuration to config.json file"""
     try:
-        config_path = str(CONFIG_FILE)
-        with open(config_path, 'w') as f:
-            f.write('"""\nEmail Monitor Configuration\n')
-            f.write('--------------------------\n')
-            f.write('This file contains the settings for the EmailMonitor application.\n\n')
-            f.write('When setting up:\n')
-            f.write('1. Replace the placeholder values with your actual credentials\n')
-            f.write('2. Make sure to obtain an App Password for Gmail to use with this application\n')
-            f.write('   (https://support.google.com/accounts/answer/185833)\n')
-            f.write('"""\n\n')
-            f.write("# Gmail IMAP settings\n")
-            f.write(f"IMAP_SERVER = '{config_data['IMAP_SERVER']}'\n")
-            f.write(f"EMAIL_ACCOUNT = '{config_data['EMAIL_ACCOUNT']}'\n")
-            f.write(f"APP_PASSWORD = '{config_data['APP_PASSWORD']}'\n\n")
-            f.write("# Email search criteria\n")
-            f.write(f"KEYWORD = '{config_data['KEYWORD']}'\n\n")
-            f.write("# Monitoring settings\n")
-            f.write(f"POLL_INTERVAL_SECONDS = {config_data['POLL_INTERVAL_SECONDS']}\n\n")
-            f.write("# Mailbox to monitor\n")
-            f.write(f"MAILBOX = \"{config_data['MAILBOX']}\"\n")
+        _write_config_file(config_data)
         return True
     except Exception as e:
         tk_messagebox.showerror("Error Saving Config", f"Could not save configuration: {e}")
@@ -114,7 +184,8 @@ class TestableSetupWizard:
         self.config = initial_config if initial_config else load_configuration()
         self.result_config = None
         
-        # Create mock entry fields for tests
+        # Create mock entry fields for tests (unittest.mock is only imported when needed)
+        from unittest.mock import MagicMock
         self.imap_server_entry = MagicMock()
         self.email_account_entry = MagicMock()
         self.app_password_entry = MagicMock()
@@ -256,12 +327,30 @@ class EmailMonitorApp:
         self.monitoring_active = False
         self.monitoring_thread = None
         self.stop_event = threading.Event()
-        self.processed_email_ids = set()
+        # Serializes start/stop/quit, which can be triggered from both the window and the tray
+        self._state_lock = threading.Lock()
+        self.processed_email_ids = ProcessedUids()
+        # (server, account, mailbox) the processed UIDs belong to
+        self._processed_mailbox_key = None
+        # Socket of the live IMAP connection, shut down on stop to interrupt blocking reads
+        self._mail_sock = None
         self.log_queue = queue.Queue()
+        # Set while a <<LogMessage>> event is queued and the log queue not yet drained
+        self._log_drain_pending = threading.Event()
+        # Wakes the log notifier thread, started on the first message from another thread
+        self._log_wakeup = threading.Event()
+        self._log_notifier = None
+        # Log timestamp of the last drain, reformatted only when the second changes
+        self._last_stamp_sec = None
+        self._last_stamp_str = ""
+        self.root.bind("<<LogMessage>>", lambda event: self.check_log_queue())
 
         # Set up UI
         self.create_main_widgets()
-        self.setup_tray_icon()
+        # Set up the tray icon once the main window is idle, so loading its image
+        # and starting pystray don't delay the first paint
+        self.tray_icon = None
+        self.root.after_idle(self.setup_tray_icon)
         self.check_log_queue()
 
         # Initial app state
@@ -274,13 +363,12 @@ class EmailMonitorApp:
 
     def _is_config_valid(self, config_data):
         """Check if the configuration has all required values properly set"""
-        if not config_data.get("EMAIL_ACCOUNT") or config_data.get("EMAIL_ACCOUNT") == DEFAULT_CONFIG["EMAIL_ACCOUNT"]:
-            return False
-        if not config_data.get("APP_PASSWORD"):
-            return False
-        if not config_data.get("KEYWORD") or config_data["KEYWORD"] == DEFAULT_CONFIG["KEYWORD"]:
-            return False
-        return True
+        email_account = config_data.get("EMAIL_ACCOUNT")
+        keyword = config_data.get("KEYWORD")
+        # Placeholders from DEFAULT_CONFIG don't count as set
+        return bool(email_account and email_account != DEFAULT_CONFIG["EMAIL_ACCOUNT"]
+                    and config_data.get("APP_PASSWORD")
+                    and keyword and keyword != DEFAULT_CONFIG["KEYWORD"])
 
     def create_main_widgets(self):
         """Create the main application UI widgets"""
@@ -345,186 +433,291 @@ class EmailMonitorApp:
             self.run_setup_wizard(force_setup=True)
             return
             
-        if self.monitoring_active:
-            self.log_message_gui("Monitoring is already active.")
-            return
-
-        # Update UI state
-        self.status_label.config(text="Status: Monitoring...")
-        self.monitoring_active = True
-        self.stop_event.clear()
-        self.processed_email_ids.clear()
-        self.update_gui_state()
-        self.log_message_gui("Monitoring started.")
+        # Checked and set under the lock so overlapping requests can't launch a second thread
+        with self._state_lock:
+            if self.monitoring_active:
+                self.log_message_gui("Monitoring is already active.")
+                return
+
+            # Update UI state
+            self.status_label.config(text="Status: Monitoring...")
+            self.monitoring_active = True
+            self.stop_event.clear()
+            # UIDs only identify messages within one mailbox, so the history is kept
+            # across Stop/Start and only dropped when a different mailbox is monitored
+            mailbox_key = tuple(self.current_config.get(key) for key in ('IMAP_SERVER', 'EMAIL_ACCOUNT', 'MAILBOX'))
+            if mailbox_key != self._processed_mailbox_key:
+                self.processed_email_ids.clear()
+                self._processed_mailbox_key = mailbox_key
+            self.update_gui_state()
+            self.log_message_gui("Monitoring started.")
         
-        # Start monitoring thread
-        self.monitoring_thread = threading.Thread(target=self._monitoring_loop, daemon=True)
-        self.monitoring_thread.start()
+            # Start monitoring thread
+            self.monitoring_thread = threading.Thread(target=self._monitoring_loop, daemon=True)
+            self.monitoring_thread.start()
 
     def stop_monitoring(self):
         """Stop the email monitoring process"""
-        if not self.monitoring_active:
-            self.log_message_gui("Monitoring is not active.")
-            return
+        with self._state_lock:
+            if not self.monitoring_active:
+                self.log_message_gui("Monitoring is not active.")
+                return
 
-        self.log_message_gui("Attempting to stop monitoring...")
-        self.stop_event.set()
-        self.monitoring_active = False
+            self.log_message_gui("Attempting to stop monitoring...")
+            self.stop_event.set()
+            self.monitoring_active = False
+            self._interrupt_connection()
 
-        # Wait for thread to finish - always call join for test compatibility
-        thread_timeout = self.current_config.get("POLL_INTERVAL_SECONDS", 30) + 5
-        if self.monitoring_thread:
-            self.monitoring_thread.join(timeout=thread_timeout)
+            # Wait for thread to finish - always call join for test compatibility
+            thread_timeout = self.current_config.get("POLL_INTERVAL_SECONDS", 30) + 5
+            if self.monitoring_thread:
+                self.monitoring_thread.join(timeout=thread_timeout)
         
-        if self.monitoring_thread and self.monitoring_thread.is_alive():
-            self.log_message_gui("Monitoring thread did not stop in time. It might be stuck.")
-        else:
-            self.log_message_gui("Monitoring stopped.")
+            if self.monitoring_thread and self.monitoring_thread.is_alive():
+                self.log_message_gui("Monitoring thread did not stop in time. It might be stuck.")
+            else:
+                self.log_message_gui("Monitoring stopped.")
             
-        self.status_label.config(text="Status: Stopped")
-        self.update_gui_state()
+            self.status_label.config(text="Status: Stopped")
+            self.update_gui_state()
+
+    def _close_connection(self, mail):
+        """Log out of the mail server, quietly if the socket was shut down on stop
+
+        The socket is shut down even if CLOSE or LOGOUT fails, so reconnecting
+        after an error doesn't leak it.
+        """
+        self._mail_sock = None
+        if not mail:
+            return
+        try:
+            mail.close()
+        except Exception as e_close:
+            if not self.stop_event.is_set():
+                self.log_message_gui(f"Error closing mailbox: {e_close}")
+        try:
+            mail.logout()
+        except Exception as e_logout:
+            if not self.stop_event.is_set():
+                self.log_message_gui(f"Error during logout: {e_logout}")
+            # logout() only shuts the socket down once the server has answered
+            try:
+                mail.shutdown()
+            except Exception:
+                pass
+
+    def _interrupt_connection(self):
+        """Shut down the IMAP socket so a blocking connect, fetch or IDLE returns at once"""
+        sock = self._mail_sock
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # Already closed
 
     def _monitoring_loop(self):
         """Background thread function that monitors emails"""
         self.log_message_gui(f"Monitoring for emails with keyword: '{self.current_config['KEYWORD']}'")
         self.log_message_gui(f"Polling interval: {self.current_config['POLL_INTERVAL_SECONDS']} seconds.")
 
-        while not self.stop_event.is_set():
-            mail = None
-            try:
-                # Connect to mail server
-                mail = connect_to_gmail(self.current_config, logger=self.log_message_gui)
-
-                if not mail:
-                    self.log_message_gui(f"Failed to connect. Retrying in {self.current_config['POLL_INTERVAL_SECONDS']} seconds...")
-                    self.stop_event.wait(self.current_config['POLL_INTERVAL_SECONDS'])
-                    continue
-                
-                # Search for matching emails
-                email_ids = em_search_emails(mail, self.current_config, logger=self.log_message_gui)
-
-                if not email_ids:
-                    self.log_message_gui("No new emails found. Waiting...")
-                
-                # Process each email
-                for e_id_bytes in reversed(email_ids):
+        # One connection is kept for the whole run and only replaced after a connection error
+        mail = None
+        use_idle = False
+        # Failed connects and aborted connections since the last successful check
+        failures = 0
+        last_activity = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    if mail is None:
+                        mail = connect_to_gmail(self.current_config, logger=self.log_message_gui)
+                        if not mail:
+                            # Back off while the server stays unreachable
+                            failures += 1
+                            delay = reconnect_delay(self.current_config['POLL_INTERVAL_SECONDS'], failures)
+                            self.log_message_gui(f"Failed to connect. Retrying in {delay} seconds...")
+                            if self.stop_event.wait(delay):
+                                break
+                            continue
+                        self._mail_sock = mail.sock
+                        if self.stop_event.is_set():
+                            # Stop was requested while connecting, before the socket could be interrupted
+                            break
+
+                        use_idle = supports_idle(mail)
+                        if use_idle:
+                            self.log_message_gui("Server supports IDLE. Waiting for new mail notifications.")
+                    elif time.monotonic() - last_activity > NOOP_INTERVAL_SECONDS:
+                        # Servers drop sessions that stay quiet too long
+                        mail.noop()
+
+                    # With IDLE, search again whenever the server reports new mail.
+                    # Emails left unhandled are retried when IDLE times out.
+                    while not self.stop_event.is_set():
+                        handled_all = self._check_for_new_emails(mail)
+                        failures = 0
+                        if not use_idle:
+                            break
+                        while not self.stop_event.is_set() and not idle_wait(
+                                mail, IDLE_TIMEOUT_SECONDS, self.log_message_gui,
+                                stop_event=self.stop_event) and handled_all:
+                            pass
+                    last_activity = time.monotonic()
+
+                except (imaplib.IMAP4.abort, OSError) as e:
+                    self._close_connection(mail)
+                    mail = None
+                    # stop_monitoring shuts the socket down, which surfaces here as an abort or OSError
                     if self.stop_event.is_set():
                         break
-                        
-                    e_id_str = e_id_bytes.decode() if isinstance(e_id_bytes, bytes) else e_id_bytes
-                    if e_id_bytes in self.processed_email_ids:
-                        continue
-
-                    # Process this email
-                    self._process_single_email(mail, e_id_bytes, e_id_str)
-                    
-                    if self.stop_event.is_set():
+                    # A connection that was working is replaced at once. If it drops again
+                    # before a check succeeds (e.g. on SELECT), back off as for failed connects.
+                    if failures:
+                        delay = reconnect_delay(self.current_config['POLL_INTERVAL_SECONDS'], failures)
+                        self.log_message_gui(f"IMAP connection aborted: {e}. Reconnecting in {delay} seconds...")
+                    else:
+                        delay = 0
+                        self.log_message_gui(f"IMAP connection aborted: {e}. Reconnecting...")
+                    failures += 1
+                    if delay and self.stop_event.wait(delay):
                         break
-            
-            except imaplib.IMAP4.abort as e:
-                self.log_message_gui(f"IMAP connection aborted: {e}. Retrying connection...")
-            except Exception as e:
-                self.log_message_gui(f"Error in monitoring loop: {type(e).__name__} - {e}")
-            finally:
-                # Clean up mail connection
-                if mail:
-                    try:
-                        mail.close()
-                        mail.logout()
-                    except Exception as e_logout:
-                        self.log_message_gui(f"Error during logout: {e_logout}")
-            
-            # Wait for next polling cycle if not stopping
-            if not self.stop_event.is_set():
-                self.stop_event.wait(self.current_config['POLL_INTERVAL_SECONDS'])
-        
+                    continue
+                except Exception as e:
+                    self.log_message_gui(f"Error in monitoring loop: {type(e).__name__} - {e}")
+
+                # Wait for next polling cycle; wait() returns True at once if stopping
+                if self.stop_event.wait(self.current_config['POLL_INTERVAL_SECONDS']):
+                    break
+        finally:
+            self._close_connection(mail)
+
         self.log_message_gui("Monitoring loop finished.")
 
-    def _process_single_email(self, mail, e_id_bytes, e_id_str):
-        """Process a single email message"""
-        status, msg_data_raw = mail.fetch(e_id_bytes, '(RFC822)')
-        if status != 'OK':
-            self.log_message_gui(f"Failed to fetch email ID {e_id_str}")
-            return
+    def _check_for_new_emails(self, mail):
+        """Search the mailbox once and process any new matching emails
+
+        Returns True if every new email was handled.
+        """
+        email_ids = em_search_emails(mail, self.current_config, logger=self.log_message_gui)
 
-        for response_part in msg_data_raw:
-            if self.stop_event.is_set():
+        if not email_ids:
+            self.log_message_gui("No new emails found. Waiting...")
+        
+        # Fetch the headers and text parts of all new emails in batches, skipping attachments
+        new_email_ids = [e_id for e_id in reversed(email_ids) if e_id not in self.processed_email_ids]
+        fetched_emails = fetch_emails_text(mail, new_email_ids, logger=self.log_message_gui) if new_email_ids else {}
+
+        # Process each email, then mark them all as read with one STORE
+        handled_ids = []
+        stop_is_set = self.stop_event.is_set
+        for e_id_bytes in new_email_ids:
+            if stop_is_set():
                 break
                 
-            if not isinstance(response_part, tuple):
+            e_id_str = e_id_bytes.decode() if isinstance(e_id_bytes, bytes) else e_id_bytes
+            fetched = fetched_emails.get(e_id_bytes)
+            if fetched is None:
+                self.log_message_gui(f"Failed to fetch email ID {e_id_str}")
                 continue
-                
-            # Parse email message
-            msg = email.message_from_bytes(response_part[1])
-            subject = decode_subject(msg['subject'])
-            from_ = msg.get('From')
-            self.log_message_gui(f"Processing ID {e_id_str}: From: {from_}, Subject: {subject}")
-
-            # Check for keyword match
-            keyword = self.current_config['KEYWORD'].lower()
-            keyword_in_subject = keyword in subject.lower()
-            link = None
-            keyword_in_body = False
-            
-            # Process email body parts
-            for part in msg.walk():
-                if self.stop_event.is_set():
-                    break
-                    
-                if part.get_content_type() in ["text/plain", "text/html"] and \
-                   "attachment" not in str(part.get("Content-Disposition")):
-                    try:
-                        body_part_content = part.get_payload(decode=True).decode()
-                    except UnicodeDecodeError:
-                        try:
-                            body_part_content = part.get_payload(decode=True).decode('latin-1', errors='replace')
-                        except:
-                            continue
-                    
-                    if keyword in body_part_content.lower():
-                        keyword_in_body = True
-                    
-                    if not link:
-                        url_match = extract_link_from_email(msg, logger=self.log_message_gui)
-                        if url_match:
-                            link = url_match
-                    
-                    if link and keyword_in_body:
-                        break
-            
-            # Handle email based on keyword match
-            if keyword_in_subject or keyword_in_body:
-                if link:
-                    self.log_message_gui(f"Found link in email ID {e_id_str}: {link}")
-                    open_link_in_browser(link, logger=self.log_message_gui)
-                    mark_as_read(mail, e_id_bytes, self.current_config, logger=self.log_message_gui)
-                else:
-                    self.log_message_gui(f"Keyword found in ID {e_id_str}, but no link.")
-                    mark_as_read(mail, e_id_bytes, self.current_config, logger=self.log_message_gui)
-            else:
-                self.log_message_gui(f"Keyword not in subject/body of ID {e_id_str} after fetch. Skipping.")
-            
-            # Mark email as processed
-            self.processed_email_ids.add(e_id_bytes)
+
+            # Process this email
+            self._process_single_email(mail, e_id_bytes, e_id_str, fetched)
+            handled_ids.append(e_id_bytes)
+
+        mark_emails_as_read(mail, handled_ids, self.current_config, logger=self.log_message_gui)
+        return len(handled_ids) == len(new_email_ids)
+
+    def _process_single_email(self, mail, e_id_bytes, e_id_str, fetched):
+        """Process a single email from its fetched (headers, text bodies) pair.
+
+        The caller marks it as read together with the rest of the batch.
+        """
+        headers, bodies = fetched
+        subject = headers['subject'] or ""
+        from_ = headers.get('From')
+        self.log_message_gui(f"Processing ID {e_id_str}: From: {from_}, Subject: {subject}")
+
+        # The UID SEARCH already matched the keyword server-side, so the bodies are only
+        # scanned for the link. They hold the text/plain part, or text/html when there is none.
+        link = None
+        for body_content in bodies:
+            link = extract_link_from_text(body_content)
+            if link:
+                break
+        
+        if link:
+            self.log_message_gui(f"Found link in email ID {e_id_str}: {link}")
+            open_link_in_browser(link, logger=self.log_message_gui)
+        else:
+            self.log_message_gui(f"Keyword found in ID {e_id_str}, but no link.")
+        
+        # Mark email as processed
+        self.processed_email_ids.add(e_id_bytes)
 
     def log_message_gui(self, message):
-        """Add a message to the log queue to be displayed in the GUI"""
+        """Add a message to the log queue and wake the GUI thread to display it
+
+        Only the first message after a drain generates an event; the rest are
+        picked up by the same drain. Other threads don't call into Tk themselves:
+        tkinter makes them wait for the main loop, which may be busy joining that
+        very thread, so the wake-up is handed to the log notifier thread instead.
+        """
         self.log_queue.put(message)
+        if self._log_drain_pending.is_set():
+            return
+        self._log_drain_pending.set()
+        if threading.current_thread() is threading.main_thread():
+            self._generate_log_event()
+        else:
+            if self._log_notifier is None:
+                self._log_notifier = threading.Thread(target=self._run_log_notifier, name="log-notifier", daemon=True)
+                self._log_notifier.start()
+            self._log_wakeup.set()
+
+    def _generate_log_event(self):
+        """Queue a <<LogMessage>> event; returns False once the main loop has exited"""
+        try:
+            self.root.event_generate("<<LogMessage>>", when="tail")
+            return True
+        except (RuntimeError, tk.TclError):
+            return False
+
+    def _run_log_notifier(self):
+        """Generate <<LogMessage>> events for messages logged from other threads"""
+        while True:
+            self._log_wakeup.wait()
+            self._log_wakeup.clear()
+            if not self._generate_log_event():
+                return
 
     def check_log_queue(self):
-        """Process pending log messages from the queue"""
+        """Display all pending log messages from the queue"""
+        # Cleared before draining, so a message queued from now on raises a new event
+        self._log_drain_pending.clear()
+        messages = []
         try:
             while True:
-                message = self.log_queue.get_nowait()
-                self.log_text.config(state=tk.NORMAL)
-                self.log_text.insert(tk.END, f"[{time.strftime('%H:%M:%S')}] {message}\n")
-                self.log_text.see(tk.END)
-                self.log_text.config(state=tk.DISABLED)
+                messages.append(self.log_queue.get_nowait())
         except queue.Empty:
             pass
-        finally:
-            # Check again after a delay
-            self.root.after(100, self.check_log_queue)
+
+        # One insert per drain instead of one Tk round-trip per message
+        if messages:
+            now = int(time.time())
+            if now != self._last_stamp_sec:
+                self._last_stamp_sec = now
+                self._last_stamp_str = time.strftime('%H:%M:%S', time.localtime(now))
+            timestamp = self._last_stamp_str
+            chunk = "".join(f"[{timestamp}] {message}\n" for message in messages)
+            self.log_text.config(state=tk.NORMAL)
+            self.log_text.insert(tk.END, chunk)
+            # The text ends with a newline, so the last line index is one past the last message
+            line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+            if line_count > MAX_LOG_LINES:
+                self.log_text.delete('1.0', f'{line_count - MAX_LOG_LINES + 1}.0')
+            self.log_text.see(tk.END)
+            self.log_text.config(state=tk.DISABLED)
 
     def update_gui_state(self):
         """Update the GUI elements based on the application state"""
@@ -570,28 +763,18 @@ class EmailMonitorApp:
             return
 
         try:
-            icon_path = "icon.png"
-            dummy_image = None
+            icon_path = ICON_FILE
 
-            # If icon file doesn't exist, create a dummy icon
-            if not os.path.exists(icon_path):
-                try:
-                    dummy_image = Image.new('RGB', (64, 64), color='blue')
-                    dummy_image.save(icon_path)
-                    self.log_message_gui(f"'{icon_path}' not found. Created a dummy icon. Replace with your desired icon.")
-                except Exception as e:
-                    self.log_message_gui(f"Could not create dummy icon: {e}. Tray icon might not work.")
-                    self.tray_icon = None
-                    return
-
-            # Load the icon image
+            # Load the icon image, falling back to the built-in default icon
             try:
                 if os.path.exists(icon_path):
-                    image = Image.open(icon_path) 
+                    image = Image.open(icon_path)
                 else:
-                    image = dummy_image or Image.new('RGB', (64, 64), color='blue')
+                    image = Image.open(io.BytesIO(base64.b64decode(_DEFAULT_ICON_PNG_B64)))
+                    self.log_message_gui(f"'{icon_path}' not found. Using the default icon. Add your own '{icon_path}' to replace it.")
             except Exception:
                 # Last resort for tests
+                from unittest.mock import MagicMock
                 image = MagicMock()
                 
             # Create the tray icon with menu
@@ -648,10 +831,12 @@ class EmailMonitorApp:
         self.log_message_gui("Exiting application...")
         
         # Stop monitoring if active
-        if self.monitoring_active:
-            self.stop_event.set()
-            if self.monitoring_thread and self.monitoring_thread.is_alive():
-                self.monitoring_thread.join(timeout=5)
+        with self._state_lock:
+            if self.monitoring_active:
+                self.stop_event.set()
+                self._interrupt_connection()
+                if self.monitoring_thread and self.monitoring_thread.is_alive():
+                    self.monitoring_thread.join(timeout=5)
                 
         # Stop tray icon if exists
         if self.tray_icon:
@@ -1,8 +1,12 @@
 """
 Global pytest configuration to ensure tests don't hang due to GUI or network operations.
 """
+import os
 import sys
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, Mock
+
+# Let the test modules import email_monitor and gui_app from the repo root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 # Create proper mock classes instead of just MagicMock instances
@@ -68,13 +72,35 @@ class MockIMAP4:
         """IMAP4 error class"""
         pass
 
+    class abort(error):
+        """IMAP4 abort class (connection-level failure)"""
+        pass
+
     def __init__(self):
         pass
 
 
-class MockIMAP4_SSL(MagicMock):
+class MockIMAP4_SSL:
     """Mock class for imaplib.IMAP4_SSL"""
-    pass
+    def __init__(self, *args, **kwargs):
+        self.capabilities = ('IMAP4REV1',)
+        # Socket options, shutdown on stop and the non-blocking peek during IDLE
+        self.sock = Mock()
+        self.file = Mock()
+        self.file.peek.return_value = b''
+        self.login = Mock(return_value=('OK', [b'']))
+        self.select = Mock(return_value=('OK', [b'1']))
+        self.uid = Mock(return_value=('OK', [b'']))
+        self.noop = Mock(return_value=('OK', [b'']))
+        self.response = Mock(return_value=('EXISTS', [None]))
+        # Raw access used by IDLE
+        self._new_tag = Mock(return_value=b'A001')
+        self.tagged_commands = {}
+        self.send = Mock()
+        self.readline = Mock(return_value=b'')
+        self.close = Mock()
+        self.logout = Mock()
+        self.shutdown = Mock()
 
 
 def mock_messagebox_function(*args, **kwargs):
@@ -1,17 +1,17 @@
 import unittest
-import sys
-import os
+import json
 from unittest.mock import patch, mock_open, MagicMock
-import tkinter as tk
 
-# Add parent directory to path to import modules to be tested
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 import gui_app
 
 class TestConfigFunctions(unittest.TestCase):
     """Unit tests for configuration handling functions in gui_app.py"""
 
     def setUp(self):
+        # Start every test with an empty config cache
+        gui_app._CONFIG_CACHE.update(key=None, data=None)
+        self.addCleanup(gui_app._CONFIG_CACHE.update, key=None, data=None)
+        
         self.default_config = {
             "IMAP_SERVER": "imap.gmail.com",
             "EMAIL_ACCOUNT": "YOUR_EMAIL@gmail.com",
@@ -31,7 +31,17 @@ class TestConfigFunctions(unittest.TestCase):
         }
         
         # Sample config file content
-        self.config_file_content = '''# Gmail IMAP settings
+        self.config_file_content = json.dumps({
+            "IMAP_SERVER": "imap.test.com",
+            "EMAIL_ACCOUNT": "test@example.com",
+            "APP_PASSWORD": "test_password",
+            "KEYWORD": "test_keyword",
+            "POLL_INTERVAL_SECONDS": 60,
+            "MAILBOX": "TestBox"
+        }, indent=2)
+        
+        # Sample legacy config.py content
+        self.legacy_config_file_content = '''# Gmail IMAP settings
 IMAP_SERVER = 'imap.test.com'
 EMAIL_ACCOUNT = 'test@example.com'  # Replace with your Gmail address
 APP_PASSWORD = 'test_password'      # Replace with your Gmail app password
@@ -57,27 +67,12 @@ MAILBOX = "TestBox"
         m = mock_open(read_data=self.config_file_content)
         
         with patch('os.path.exists', return_value=True), \
-             patch('builtins.open', m), \
-             patch('builtins.exec') as mock_exec:
-            
-            # Mock exec to set values in globals dict
-            def side_effect(content, globals_dict):
-                globals_dict.update({
-                    'IMAP_SERVER': 'imap.test.com',
-                    'EMAIL_ACCOUNT': 'test@example.com',
-                    'APP_PASSWORD': 'test_password',
-                    'KEYWORD': 'test_keyword',
-                    'POLL_INTERVAL_SECONDS': 60,
-                    'MAILBOX': 'TestBox'
-                })
-            mock_exec.side_effect = side_effect
+             patch('builtins.open', m):
             
             config = gui_app.load_configuration()
             
             # Verify file was opened
             m.assert_called_once_with(gui_app.CONFIG_FILE, 'r')
-            # Verify exec was called
-            self.assertTrue(mock_exec.called)
             # Verify config values were loaded correctly
             self.assertEqual(config['IMAP_SERVER'], 'imap.test.com')
             self.assertEqual(config['EMAIL_ACCOUNT'], 'test@example.com')
@@ -89,8 +84,7 @@ MAILBOX = "TestBox"
     def test_load_configuration_handles_exception(self):
         """Test that load_configuration handles exceptions and returns default config"""
         with patch('os.path.exists', return_value=True), \
-             patch('builtins.open', mock_open(read_data="invalid python code")), \
-             patch('builtins.exec', side_effect=Exception("Syntax error")), \
+             patch('builtins.open', mock_open(read_data="not valid json")), \
              patch('builtins.print') as mock_print:
             
             config = gui_app.load_configuration()
@@ -100,32 +94,93 @@ MAILBOX = "TestBox"
             # Verify error is printed
             mock_print.assert_called()
 
+    def test_load_configuration_uses_cache_until_file_changes(self):
+        """Test that an unchanged config file is only parsed once"""
+        m = mock_open(read_data=self.config_file_content)
+        
+        with patch('os.path.exists', return_value=True), \
+             patch('gui_app._config_file_key', return_value=(1, 100)) as mock_file_key, \
+             patch('builtins.open', m):
+            first = gui_app.load_configuration()
+            second = gui_app.load_configuration()
+            
+            # Verify the file was read once and a copy of the cached config was returned
+            m.assert_called_once_with(gui_app.CONFIG_FILE, 'r')
+            self.assertEqual(first, second)
+            self.assertIsNot(first, second)
+            self.assertEqual(second['MAILBOX'], 'TestBox')
+            
+            # A changed modification time forces a re-read
+            mock_file_key.return_value = (2, 100)
+            gui_app.load_configuration()
+            self.assertEqual(m.call_count, 2)
+
     def test_save_configuration_success(self):
         """Test successful saving of configuration"""
         m = mock_open()
         
-        with patch('builtins.open', m):
+        with patch('builtins.open', m), \
+             patch('os.fsync'), \
+             patch('os.replace') as mock_replace:
             result = gui_app.save_configuration(self.test_config)
             
-            # Verify file was opened for writing
-            m.assert_called_once_with(gui_app.CONFIG_FILE, 'w')
-            # Verify all config values were written
+            # Verify a temporary file was written and then moved into place
+            temp_file = gui_app.CONFIG_FILE + ".tmp"
+            m.assert_called_once_with(temp_file, 'w')
+            mock_replace.assert_called_once_with(temp_file, gui_app.CONFIG_FILE)
+            # Verify all config values were written as JSON in a single write
             handle = m()
-            self.assertIn(f"IMAP_SERVER = '{self.test_config['IMAP_SERVER']}'", 
-                         ''.join(call_args[0][0] for call_args in handle.write.call_args_list))
-            self.assertIn(f"EMAIL_ACCOUNT = '{self.test_config['EMAIL_ACCOUNT']}'", 
-                         ''.join(call_args[0][0] for call_args in handle.write.call_args_list))
-            self.assertIn(f"APP_PASSWORD = '{self.test_config['APP_PASSWORD']}'", 
-                         ''.join(call_args[0][0] for call_args in handle.write.call_args_list))
-            self.assertIn(f"KEYWORD = '{self.test_config['KEYWORD']}'", 
-                         ''.join(call_args[0][0] for call_args in handle.write.call_args_list))
-            self.assertIn(f"POLL_INTERVAL_SECONDS = {self.test_config['POLL_INTERVAL_SECONDS']}", 
-                         ''.join(call_args[0][0] for call_args in handle.write.call_args_list))
-            self.assertIn(f"MAILBOX = \"{self.test_config['MAILBOX']}\"", 
-                         ''.join(call_args[0][0] for call_args in handle.write.call_args_list))
+            handle.write.assert_called_once()
+            self.assertEqual(json.loads(handle.write.call_args[0][0]), self.test_config)
             # Verify function returned True on success
             self.assertTrue(result)
 
+    def _run_legacy_migration(self, legacy_content):
+        """Load the configuration with only a config.py present, on an in-memory file system"""
+        files = {gui_app.LEGACY_CONFIG_FILE: legacy_content}
+        
+        def fake_open(path, mode='r'):
+            if 'w' in mode:
+                handle = mock_open()()
+                handle.write.side_effect = lambda data: files.__setitem__(path, files.get(path, '') + data)
+                files[path] = ''
+                return handle
+            return mock_open(read_data=files[path])()
+        
+        with patch('os.path.exists', side_effect=lambda path: path in files), \
+             patch('builtins.open', side_effect=fake_open), \
+             patch('os.fsync'), \
+             patch('os.replace', side_effect=lambda src, dst: files.__setitem__(dst, files.pop(src))) as mock_replace, \
+             patch('os.remove') as mock_remove, \
+             patch('builtins.print'):
+            config = gui_app.load_configuration()
+        
+        mock_remove.assert_not_called()
+        return config, files, mock_replace
+
+    def test_load_configuration_migrates_legacy_config(self):
+        """Test that an old config.py is converted to config.json and kept as a backup"""
+        config, files, mock_replace = self._run_legacy_migration(self.legacy_config_file_content)
+        
+        # Verify config.json was written through the temporary file and config.py was renamed
+        mock_replace.assert_any_call(gui_app.CONFIG_FILE + ".tmp", gui_app.CONFIG_FILE)
+        mock_replace.assert_any_call(gui_app.LEGACY_CONFIG_FILE, gui_app.LEGACY_CONFIG_BACKUP)
+        self.assertEqual(files[gui_app.LEGACY_CONFIG_BACKUP], self.legacy_config_file_content)
+        self.assertEqual(json.loads(files[gui_app.CONFIG_FILE])['MAILBOX'], 'TestBox')
+        self.assertEqual(config['KEYWORD'], 'test_keyword')
+        self.assertEqual(config['POLL_INTERVAL_SECONDS'], 60)
+
+    def test_load_configuration_keeps_legacy_config_with_unreadable_settings(self):
+        """Test that config.py is left alone when a required setting can't be parsed"""
+        content = self.legacy_config_file_content.replace(
+            "APP_PASSWORD = 'test_password'", "APP_PASSWORD = os.environ['GMAIL_APP_PASSWORD']")
+        
+        config, files, mock_replace = self._run_legacy_migration(content)
+        
+        mock_replace.assert_not_called()
+        self.assertEqual(files, {gui_app.LEGACY_CONFIG_FILE: content})
+        self.assertEqual(config, gui_app.DEFAULT_CONFIG)
+
     def test_save_configuration_failure(self):
         """Test handling of failure to save configuration"""
         with patch('builtins.open', side_effect=Exception("Permission denied")), \
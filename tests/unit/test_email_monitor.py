@@ -1,19 +1,11 @@
 import unittest
-import sys
-import os
 from unittest.mock import patch, MagicMock, call
 
-# Import modules we need first
-import email
-from email.message import Message
-
 # Since our script is using the email_monitor.py module which has dependencies on imaplib,
 # we need to mock it before importing email_monitor
 # Here we'll use a custom strategy to ensure tests still run properly
 # without making any real network connections when the module is imported
 
-# Add parent directory to path to import the module to be tested
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 # Create a custom pytest conftest setup that runs before any tests
 # to prevent the email_monitor module from making real connections
@@ -22,12 +14,13 @@ class TestEmailMonitor(unittest.TestCase):
     
     def setUp(self):
         """Set up test fixtures, called before each test method"""
-        # Patch imaplib before each test starts
-        self.imaplib_patcher = patch('imaplib.IMAP4_SSL')
-        self.mock_imaplib = self.imaplib_patcher.start()
+        # Swap in a fresh IMAP4_SSL mock before each test starts. imaplib is already
+        # a stand-in from conftest.py, so plain assignment is enough here.
+        import imaplib
+        self._original_imap4_ssl = imaplib.IMAP4_SSL
+        self.mock_imaplib = imaplib.IMAP4_SSL = MagicMock()
         
         # Create a proper mock IMAP4 error class
-        import imaplib
         if not hasattr(imaplib.IMAP4, 'error') or not issubclass(imaplib.IMAP4.error, Exception):
             imaplib.IMAP4.error = type('error', (Exception,), {})
         
@@ -46,14 +39,44 @@ class TestEmailMonitor(unittest.TestCase):
     
     def tearDown(self):
         """Clean up after each test"""
-        self.imaplib_patcher.stop()
+        import imaplib
+        imaplib.IMAP4_SSL = self._original_imap4_ssl
     
     # Now import email_monitor within each test method to avoid connection issues
     
+    def test_console_log_message_formats_timestamp_once_per_second(self):
+        """Test that log lines within the same second reuse the formatted timestamp"""
+        import email_monitor
+        
+        with patch('email_monitor.time.time', return_value=1700000000.5), \
+             patch('email_monitor.time.strftime', wraps=email_monitor.time.strftime) as mock_strftime, \
+             patch('email_monitor.sys.stdout') as mock_stdout:
+            email_monitor._console_log_message("first")
+            email_monitor._console_log_message("second")
+        
+        self.assertEqual(mock_strftime.call_count, 1)
+        self.assertTrue(mock_stdout.write.call_args[0][0].endswith("] second\n"))
+
+    def test_parse_legacy_configuration_does_not_execute_code(self):
+        """Test that old config.py values are parsed rather than executed"""
+        import email_monitor
+        
+        content = ("# Gmail IMAP settings\n"
+                   "EMAIL_ACCOUNT = 'test@example.com'  # Replace with your Gmail address\n"
+                   "POLL_INTERVAL_SECONDS = 60\n"
+                   "MAILBOX = \"TestBox\"\n"
+                   "KEYWORD = __import__('os').getcwd()\n")
+        with patch('builtins.__import__') as mock_import:
+            values = email_monitor.parse_legacy_configuration(content)
+        
+        mock_import.assert_not_called()
+        self.assertEqual(values, {'EMAIL_ACCOUNT': 'test@example.com', 'POLL_INTERVAL_SECONDS': 60, 'MAILBOX': 'TestBox'})
+
     def test_connect_to_gmail_success(self):
         """Test successful connection to Gmail"""
         import email_monitor
         import imaplib
+        import socket
         
         mock_imap = MagicMock()
         self.mock_imaplib.return_value = mock_imap
@@ -61,7 +84,10 @@ class TestEmailMonitor(unittest.TestCase):
         result = email_monitor.connect_to_gmail(self.test_config, self.mock_logger)
         
         # Verify IMAP4_SSL was called with correct server
-        self.mock_imaplib.assert_called_once_with(self.test_config['IMAP_SERVER'])
+        self.mock_imaplib.assert_called_once_with(self.test_config['IMAP_SERVER'], ssl_context=email_monitor._get_ssl_context(),
+                                                  timeout=email_monitor.SOCKET_TIMEOUT_SECONDS)
+        # Verify Nagle is disabled on the connection's socket
+        mock_imap.sock.setsockopt.assert_any_call(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         # Verify login was called with correct credentials
         mock_imap.login.assert_called_once_with(
             self.test_config['EMAIL_ACCOUNT'], 
@@ -73,6 +99,18 @@ class TestEmailMonitor(unittest.TestCase):
         self.mock_logger.assert_any_call(f"Attempting to connect to {self.test_config['IMAP_SERVER']} for user {self.test_config['EMAIL_ACCOUNT']}...")
         self.mock_logger.assert_any_call(f"Successfully logged into {self.test_config['EMAIL_ACCOUNT']}")
 
+    def test_connect_to_gmail_with_default_imap_stand_in(self):
+        """Test that the conftest IMAP4_SSL stand-in supports a normal connect"""
+        import email_monitor
+        import imaplib
+        imaplib.IMAP4_SSL = self._original_imap4_ssl
+        
+        result = email_monitor.connect_to_gmail(self.test_config, self.mock_logger)
+        
+        self.assertIsNotNone(result)
+        self.mock_logger.assert_any_call(f"Successfully logged into {self.test_config['EMAIL_ACCOUNT']}")
+        self.assertFalse(email_monitor.supports_idle(result))
+
     def test_connect_to_gmail_login_failure(self):
         """Test handling of login failure"""
         import email_monitor
@@ -105,18 +143,30 @@ class TestEmailMonitor(unittest.TestCase):
         # Verify network error message was logged
         self.mock_logger.assert_any_call("Network error: Could not connect to imap.gmail.com. Details: Network error")
 
-    def test_decode_subject(self):
-        """Test subject decoding with different character encodings"""
+    def test_disconnect_from_gmail_logs_out_after_failed_close(self):
+        """Test that a failed CLOSE still logs out, and a failed LOGOUT still shuts the socket down"""
         import email_monitor
         
-        # Test plain ASCII subject
-        self.assertEqual(email_monitor.decode_subject("Simple Subject"), "Simple Subject")
+        mock_mail = MagicMock()
+        mock_mail.close.side_effect = Exception("CLOSE illegal in state AUTH")
+        mock_mail.logout.side_effect = OSError("connection reset")
+        
+        email_monitor.disconnect_from_gmail(mock_mail, self.mock_logger)
         
-        # Test UTF-8 encoded subject in header format
-        encoded_subject = "=?utf-8?b?VGVzdCBTdWJqZWN0IHdpdGggVW5pY29kZSDwn5iC?="
-        # We can't test exact result without actual encoding/decoding, but we can verify it doesn't raise exceptions
-        result = email_monitor.decode_subject(encoded_subject)
-        self.assertIsInstance(result, str)
+        mock_mail.logout.assert_called_once()
+        mock_mail.shutdown.assert_called_once()
+        self.mock_logger.assert_any_call("Error closing mailbox: CLOSE illegal in state AUTH")
+        self.mock_logger.assert_any_call("Error during logout: connection reset")
+
+    def test_header_parser_decodes_subject(self):
+        """Test that fetched subjects are decoded by the header parser, plain or RFC 2047 encoded"""
+        import email_monitor
+        
+        plain = email_monitor._HEADER_PARSER.parsebytes(b'Subject: Simple Subject\r\n\r\n')
+        self.assertEqual(plain['Subject'], "Simple Subject")
+        encoded = email_monitor._HEADER_PARSER.parsebytes(
+            b'Subject: =?utf-8?b?VGVzdCBTdWJqZWN0IHdpdGggVW5pY29kZSDwn5iC?=\r\n\r\n')
+        self.assertEqual(encoded['Subject'], "Test Subject with Unicode \U0001f602")
 
     def test_search_emails_success(self):
         """Test successful search for emails"""
@@ -124,18 +174,39 @@ class TestEmailMonitor(unittest.TestCase):
         
         mock_mail = MagicMock()
         mock_mail.select.return_value = ('OK', [b'1'])
-        mock_mail.search.return_value = ('OK', [b'1 2 3'])
+        mock_mail.uid.return_value = ('OK', [b'1 2 3'])
         
         result = email_monitor.search_emails(mock_mail, self.test_config, self.mock_logger)
         
         # Verify mailbox was selected
         mock_mail.select.assert_called_once_with(self.test_config['MAILBOX'])
-        # Verify search was performed with correct criteria
-        self.assertIn(call(None, f'(OR (UNSEEN SUBJECT "{self.test_config["KEYWORD"]}" BODY "{self.test_config["KEYWORD"]}") (SUBJECT "{self.test_config["KEYWORD"]}" BODY "{self.test_config["KEYWORD"]}"))')
-                     , mock_mail.search.call_args_list)
+        # Verify a UID search for unread emails was performed with correct criteria
+        mock_mail.uid.assert_called_once_with('SEARCH', None, f'(UNSEEN OR SUBJECT "{self.test_config["KEYWORD"]}" BODY "{self.test_config["KEYWORD"]}")')
         # Verify the result is the list of email IDs
         self.assertEqual(result, [b'1', b'2', b'3'])
 
+    def test_build_search_criteria_quotes_keyword(self):
+        """Test that quotes and backslashes in the keyword are escaped"""
+        import email_monitor
+        
+        criteria = email_monitor.build_search_criteria('say "hi"\\')
+        
+        self.assertEqual(criteria, '(UNSEEN OR SUBJECT "say \\"hi\\"\\\\" BODY "say \\"hi\\"\\\\")')
+
+    def test_search_emails_selects_mailbox_once(self):
+        """Test that repeated searches on the same connection only SELECT once"""
+        import email_monitor
+        
+        mock_mail = MagicMock()
+        mock_mail.select.return_value = ('OK', [b'1'])
+        mock_mail.uid.return_value = ('OK', [b''])
+        
+        email_monitor.search_emails(mock_mail, self.test_config, self.mock_logger)
+        email_monitor.search_emails(mock_mail, self.test_config, self.mock_logger)
+        
+        mock_mail.select.assert_called_once_with(self.test_config['MAILBOX'])
+        self.assertEqual(mock_mail.uid.call_count, 2)
+
     def test_search_emails_select_failure(self):
         """Test handling of mailbox selection failure"""
         import email_monitor
@@ -156,7 +227,7 @@ class TestEmailMonitor(unittest.TestCase):
         
         mock_mail = MagicMock()
         mock_mail.select.return_value = ('OK', [b'1'])
-        mock_mail.search.return_value = ('NO', [b'Search failed'])
+        mock_mail.uid.return_value = ('NO', [b'Search failed'])
         
         result = email_monitor.search_emails(mock_mail, self.test_config, self.mock_logger)
         
@@ -165,41 +236,321 @@ class TestEmailMonitor(unittest.TestCase):
         # Verify error was logged
         self.mock_logger.assert_any_call("Error searching emails: NO")
 
-    def test_extract_link_from_email(self):
-        """Test link extraction from email body"""
+    def test_check_for_new_emails_skips_search_without_new_messages(self):
+        """Test that SEARCH is skipped when a NOOP reports no new messages, and run when it does"""
         import email_monitor
         
-        # Create a mock email message with a link
-        mock_msg = MagicMock(spec=Message)
-        mock_part = MagicMock()
-        mock_part.get_content_type.return_value = "text/plain"
-        mock_part.get.return_value = ""  # Content-Disposition is empty
-        mock_part.get_payload.return_value = b"This email contains a link: https://example.com/test"
-        mock_msg.walk.return_value = [mock_part]
-        
-        with patch('email.message.Message.walk', return_value=[mock_part]):
-            result = email_monitor.extract_link_from_email(mock_msg, self.mock_logger)
+        mock_mail = MagicMock()
+        mock_mail._selected_mailbox = self.test_config['MAILBOX']
+        mock_mail.response.return_value = ('EXISTS', [None])
+        mailbox_state = {'handled_all': True}
+        
+        with patch('email_monitor._console_log_message'):
+            self.assertTrue(email_monitor.check_for_new_emails(mock_mail, self.test_config, set(), mailbox_state))
+            mock_mail.noop.assert_called_once()
+            mock_mail.uid.assert_not_called()
             
-            # Verify the correct link was extracted
-            self.assertEqual(result, "https://example.com/test")
-    
-    def test_extract_link_from_email_no_link(self):
-        """Test link extraction when no link is present"""
+            mock_mail.response.return_value = ('EXISTS', [b'5'])
+            mock_mail.uid.return_value = ('OK', [b''])
+            self.assertTrue(email_monitor.check_for_new_emails(mock_mail, self.test_config, set(), mailbox_state))
+        
+        mock_mail.uid.assert_called_once_with('SEARCH', None, email_monitor.build_search_criteria(self.test_config['KEYWORD']))
+        mock_mail.status.assert_not_called()
+        self.assertTrue(mailbox_state['handled_all'])
+
+    def test_check_for_new_emails_retries_failed_fetch(self):
+        """Test that an email whose fetch failed is searched for and fetched again on the next check"""
         import email_monitor
         
-        # Create a mock email message without a link
-        mock_msg = MagicMock(spec=Message)
-        mock_part = MagicMock()
-        mock_part.get_content_type.return_value = "text/plain"
-        mock_part.get.return_value = ""  # Content-Disposition is empty
-        mock_part.get_payload.return_value = b"This email does not contain a link"
-        mock_msg.walk.return_value = [mock_part]
+        mock_mail = MagicMock()
+        mock_mail._selected_mailbox = self.test_config['MAILBOX']
+        # No new EXISTS after the first check, so only the failed fetch can trigger the second search
+        mock_mail.response.return_value = ('EXISTS', [None])
+        mock_mail.uid.return_value = ('OK', [b'10'])
+        mailbox_state = {}
+        processed = email_monitor.ProcessedUids()
+        
+        with patch('email_monitor._console_log_message'), \
+             patch('email_monitor.fetch_emails_text', return_value={}) as mock_fetch, \
+             patch('email_monitor.fetch_email_text', return_value=None):
+            self.assertFalse(email_monitor.check_for_new_emails(mock_mail, self.test_config, processed, mailbox_state))
+            self.assertFalse(email_monitor.check_for_new_emails(mock_mail, self.test_config, processed, mailbox_state))
+        
+        self.assertEqual(mock_mail.uid.call_count, 2)
+        self.assertEqual(mock_fetch.call_count, 2)
+        mock_fetch.assert_called_with(mock_mail, [b'10'], unittest.mock.ANY)
+        self.assertNotIn(b'10', processed)
+        self.assertFalse(mailbox_state['handled_all'])
+
+    def test_idle_wait_new_mail(self):
+        """Test that idle_wait returns True when the server reports new mail"""
+        import email_monitor
         
-        with patch('email.message.Message.walk', return_value=[mock_part]):
-            result = email_monitor.extract_link_from_email(mock_msg, self.mock_logger)
-            
-            # Verify None is returned when no link is found
-            self.assertIsNone(result)
+        mock_mail = MagicMock()
+        mock_mail._new_tag.return_value = b'A001'
+        mock_mail.tagged_commands = {b'A001': None}
+        mock_mail.file.peek.return_value = b''
+        mock_mail.readline.side_effect = [b'+ idling\r\n', b'* 4 EXISTS\r\n', b'A001 OK IDLE terminated\r\n']
+        
+        with patch('email_monitor.select.select', return_value=([mock_mail.sock], [], [])):
+            result = email_monitor.idle_wait(mock_mail, 60, self.mock_logger)
+        
+        # Verify IDLE was started and terminated with DONE
+        self.assertTrue(result)
+        mock_mail.send.assert_has_calls([call(b'A001 IDLE\r\n'), call(b'DONE\r\n')])
+        self.mock_logger.assert_any_call("New mail notification received.")
+        # The completed IDLE command's tag is not left behind in imaplib's bookkeeping
+        self.assertEqual(mock_mail.tagged_commands, {})
+
+    def test_idle_wait_uses_imaplib_idle_when_available(self):
+        """Test that imaplib's own IDLE support is used instead of the hand-rolled IDLE"""
+        import email_monitor
+        
+        mock_mail = MagicMock()
+        idler = mock_mail.idle.return_value.__enter__.return_value
+        idler.__iter__.return_value = iter([('FLAGS', [b'(\\Seen)']), ('EXISTS', [b'7'])])
+        mock_mail.response.return_value = ('EXISTS', [None])
+        
+        with patch.object(email_monitor.imaplib.IMAP4, 'idle', create=True):
+            result = email_monitor.idle_wait(mock_mail, 60, self.mock_logger)
+        
+        self.assertTrue(result)
+        mock_mail.idle.assert_called_once_with(duration=60)
+        mock_mail._new_tag.assert_not_called()
+        mock_mail.send.assert_not_called()
+        self.mock_logger.assert_any_call("New mail notification received.")
+
+    def test_idle_wait_stops_on_stop_event(self):
+        """Test that idle_wait ends IDLE and returns False once the stop event is set"""
+        import email_monitor
+        import threading
+        
+        mock_mail = MagicMock()
+        mock_mail._new_tag.return_value = b'A002'
+        mock_mail.file.peek.return_value = b''
+        mock_mail.readline.side_effect = [b'+ idling\r\n', b'A002 OK IDLE terminated\r\n']
+        stop_event = threading.Event()
+        
+        def select_then_stop(*args):
+            stop_event.set()
+            return ([], [], [])
+        
+        with patch('email_monitor.select.select', side_effect=select_then_stop) as mock_select:
+            result = email_monitor.idle_wait(mock_mail, 60, self.mock_logger, stop_event=stop_event)
+        
+        self.assertFalse(result)
+        # Verify the wait was sliced so the stop request is noticed promptly
+        self.assertEqual(mock_select.call_args[0][3], email_monitor.IDLE_STOP_CHECK_SECONDS)
+        mock_mail.send.assert_has_calls([call(b'A002 IDLE\r\n'), call(b'DONE\r\n')])
+
+    def test_idle_wait_timeout_returns_false(self):
+        """Test that idle_wait ends IDLE and returns False when the timeout expires"""
+        import email_monitor
+        
+        mock_mail = MagicMock()
+        mock_mail._new_tag.return_value = b'A003'
+        mock_mail.readline.side_effect = [b'+ idling\r\n', b'A003 OK IDLE terminated\r\n']
+        
+        with patch('email_monitor.select.select') as mock_select:
+            result = email_monitor.idle_wait(mock_mail, 0, self.mock_logger)
+        
+        self.assertFalse(result)
+        mock_select.assert_not_called()
+        mock_mail.send.assert_has_calls([call(b'A003 IDLE\r\n'), call(b'DONE\r\n')])
+
+    def test_idle_wait_reports_mail_that_arrives_while_ending_idle(self):
+        """Test that an EXISTS read while ending IDLE still counts as new mail"""
+        import email_monitor
+        
+        mock_mail = MagicMock()
+        mock_mail._new_tag.return_value = b'A004'
+        mock_mail.readline.side_effect = [b'+ idling\r\n', b'* 3 EXISTS\r\n', b'A004 OK IDLE terminated\r\n']
+        
+        with patch('email_monitor.select.select'):
+            result = email_monitor.idle_wait(mock_mail, 0, self.mock_logger)
+        
+        self.assertTrue(result)
+        self.mock_logger.assert_any_call("New mail notification received.")
+
+    def test_idle_wait_reads_buffered_response_without_select(self):
+        """Test that a response already buffered by imaplib is read without waiting on the socket"""
+        import email_monitor
+        
+        mock_mail = MagicMock()
+        mock_mail._new_tag.return_value = b'A005'
+        mock_mail.file.peek.return_value = b'* 5 EXISTS\r\n'
+        mock_mail.readline.side_effect = [b'+ idling\r\n', b'* 5 EXISTS\r\n', b'A005 OK IDLE terminated\r\n']
+        
+        with patch('email_monitor.select.select') as mock_select:
+            result = email_monitor.idle_wait(mock_mail, 60, self.mock_logger)
+        
+        self.assertTrue(result)
+        mock_select.assert_not_called()
+        # Verify the socket's timeout is restored after the non-blocking peek
+        mock_mail.sock.settimeout.assert_called_with(mock_mail.sock.gettimeout.return_value)
+
+    def test_fetch_email_text_skips_attachments(self):
+        """Test that only headers and inline text parts are fetched"""
+        import email_monitor
+        
+        body_structure = (b'1 (UID 42 BODYSTRUCTURE (("TEXT" "PLAIN" ("CHARSET" "UTF-8") NIL NIL "QUOTED-PRINTABLE" 30 1 NIL NIL NIL)'
+                          b'("APPLICATION" "PDF" ("NAME" "a.pdf") NIL NIL "BASE64" 1000 NIL ("ATTACHMENT" ("FILENAME" "a.pdf")) NIL)'
+                          b' "MIXED" ("BOUNDARY" "xyz") NIL NIL))')
+        mock_mail = MagicMock()
+        mock_mail.uid.side_effect = [
+            ('OK', [body_structure]),
+            ('OK', [(b'1 (UID 42 BODY[HEADER.FIELDS (SUBJECT FROM)] {36}', b'Subject: Hello\r\nFrom: a@example.com\r\n\r\n'),
+                    (b' BODY[1] {28}', b'Visit https://example.com/a=3Db'),
+                    b')'])
+        ]
+        
+        headers, bodies = email_monitor.fetch_email_text(mock_mail, b'42', self.mock_logger)
+        
+        # Verify only the header fields and the text part were requested, without setting \Seen
+        mock_mail.uid.assert_called_with('FETCH', b'42', '(UID BODY.PEEK[HEADER.FIELDS (SUBJECT FROM)] BODY.PEEK[1])')
+        self.assertEqual(headers['Subject'], "Hello")
+        # Verify the quoted-printable body was decoded
+        self.assertEqual(bodies, ["Visit https://example.com/a=b"])
+
+    def test_fetch_email_text_finds_link_in_real_message(self):
+        """Test the fetch -> decode -> extract_link_from_text path with a real parsed message"""
+        import email.policy
+        import email_monitor
+        from email.message import EmailMessage
+        
+        link = 'https://example.com/verify?token=' + 'a1b2c3d4' * 8 + '&next=%2Fhome'
+        message = EmailMessage()
+        message['Subject'] = 'Your sign-in link'
+        message['From'] = 'noreply@example.com'
+        # Long enough that quoted-printable soft-breaks the link across lines
+        message.set_content(f"Caf\u00e9 sign-in: {link}\n", cte='quoted-printable')
+        message.add_alternative(f'<a href="{link}">Sign in</a>', subtype='html')
+        parsed = email.message_from_bytes(message.as_bytes(), policy=email.policy.default)
+        header_bytes = f"Subject: {parsed['Subject']}\r\nFrom: {parsed['From']}\r\n\r\n".encode()
+        plain_bytes = parsed.get_body(('plain',)).get_payload().encode()
+        
+        body_structure = (b'1 (UID 11 BODYSTRUCTURE (("TEXT" "PLAIN" ("CHARSET" "UTF-8") NIL NIL "QUOTED-PRINTABLE" %d 2 NIL NIL NIL)'
+                          b'("TEXT" "HTML" ("CHARSET" "UTF-8") NIL NIL "7BIT" 120 1 NIL NIL NIL)'
+                          b' "ALTERNATIVE" ("BOUNDARY" "xyz") NIL NIL))' % len(plain_bytes))
+        mock_mail = MagicMock()
+        mock_mail.uid.side_effect = [
+            ('OK', [body_structure]),
+            ('OK', [(b'1 (UID 11 BODY[HEADER.FIELDS (SUBJECT FROM)] {%d}' % len(header_bytes), header_bytes),
+                    (b' BODY[1] {%d}' % len(plain_bytes), plain_bytes),
+                    b')'])
+        ]
+        
+        headers, bodies = email_monitor.fetch_emails_text(mock_mail, [b'11'], self.mock_logger)[b'11']
+        
+        self.assertEqual(headers['Subject'], "Your sign-in link")
+        self.assertTrue(bodies[0].startswith("Caf\u00e9 sign-in: "))
+        self.assertEqual(email_monitor.extract_link_from_text(bodies[0]), link)
+
+    def test_fetch_email_text_prefers_plain_text(self):
+        """Test that the HTML alternative is skipped when a text/plain part exists"""
+        import email_monitor
+        
+        body_structure = (b'1 (UID 5 BODYSTRUCTURE (("TEXT" "PLAIN" ("CHARSET" "UTF-8") NIL NIL "7BIT" 20 1 NIL NIL NIL)'
+                          b'("TEXT" "HTML" ("CHARSET" "UTF-8") NIL NIL "7BIT" 80 2 NIL NIL NIL)'
+                          b' "ALTERNATIVE" ("BOUNDARY" "xyz") NIL NIL))')
+        mock_mail = MagicMock()
+        mock_mail.uid.side_effect = [
+            ('OK', [body_structure]),
+            ('OK', [(b'1 (UID 5 BODY[HEADER.FIELDS (SUBJECT FROM)] {16}', b'Subject: Hi\r\n\r\n'),
+                    (b' BODY[1] {20}', b'https://example.com/'),
+                    b')'])
+        ]
+        
+        email_monitor.fetch_email_text(mock_mail, b'5', self.mock_logger)
+        
+        mock_mail.uid.assert_called_with('FETCH', b'5', '(UID BODY.PEEK[HEADER.FIELDS (SUBJECT FROM)] BODY.PEEK[1])')
+
+    def test_fetch_emails_text_batches_uids(self):
+        """Test that several emails with the same layout are fetched in one round-trip each stage"""
+        import email_monitor
+        
+        mock_mail = MagicMock()
+        mock_mail.uid.side_effect = [
+            ('OK', [b'1 (UID 7 BODYSTRUCTURE ("TEXT" "PLAIN" ("CHARSET" "UTF-8") NIL NIL "7BIT" 20 1 NIL NIL NIL))',
+                    b'2 (UID 9 BODYSTRUCTURE ("TEXT" "PLAIN" ("CHARSET" "UTF-8") NIL NIL "7BIT" 20 1 NIL NIL NIL))']),
+            ('OK', [(b'1 (UID 7 BODY[HEADER.FIELDS (SUBJECT FROM)] {15}', b'Subject: One\r\n\r\n'),
+                    (b' BODY[1] {20}', b'https://example.com/1'),
+                    b')',
+                    (b'2 (UID 9 BODY[HEADER.FIELDS (SUBJECT FROM)] {15}', b'Subject: Two\r\n\r\n'),
+                    (b' BODY[1] {20}', b'https://example.com/2'),
+                    b')'])
+        ]
+        
+        result = email_monitor.fetch_emails_text(mock_mail, [b'7', b'9'], self.mock_logger)
+        
+        # Verify both stages used a single UID set
+        self.assertEqual(mock_mail.uid.call_count, 2)
+        mock_mail.uid.assert_any_call('FETCH', b'7,9', '(UID BODYSTRUCTURE)')
+        self.assertEqual(result[b'7'][0]['Subject'], "One")
+        self.assertEqual(result[b'9'][1], ["https://example.com/2"])
+
+    def test_fetch_emails_text_retries_rejected_batch(self):
+        """Test that a batch the server rejects is retried one UID at a time"""
+        import email_monitor
+        import imaplib
+        
+        structure = b' (UID %s BODYSTRUCTURE ("TEXT" "PLAIN" ("CHARSET" "UTF-8") NIL NIL "7BIT" 20 1 NIL NIL NIL))'
+        mock_mail = MagicMock()
+        mock_mail.uid.side_effect = [
+            imaplib.IMAP4.error("BAD parse error: maximum request size exceeded"),
+            ('OK', [b'1' + structure % b'8']),
+            ('OK', [(b'1 (UID 8 BODY[HEADER.FIELDS (SUBJECT FROM)] {17}', b'Subject: Eight\r\n\r\n'), b')']),
+            ('OK', [b'2' + structure % b'9']),
+            ('OK', [(b'2 (BODY[HEADER.FIELDS (SUBJECT FROM)] {16}', b'Subject: Nine\r\n\r\n'), b' UID 9)']),
+        ]
+        
+        result = email_monitor.fetch_emails_text(mock_mail, [b'8', b'9'], self.mock_logger)
+        
+        # Adjacent UIDs are requested as a range
+        mock_mail.uid.assert_any_call('FETCH', b'8:9', '(UID BODYSTRUCTURE)')
+        self.assertEqual(result[b'8'][0]['Subject'], "Eight")
+        self.assertEqual(result[b'9'][0]['Subject'], "Nine")
+
+    def test_decode_charset_decodes_in_one_pass(self):
+        """Test that body bytes are decoded once with the declared charset"""
+        import email_monitor
+        
+        self.assertEqual(email_monitor._decode_charset("Caf\u00e9".encode("latin-1"), "latin-1"), "Caf\u00e9")
+        # Undeclared charsets are read as UTF-8, with undecodable bytes replaced
+        self.assertEqual(email_monitor._decode_charset(b"Caf\xe9", None), "Caf\ufffd")
+        self.assertEqual(email_monitor._decode_charset(b"Caf\xe9", "x-unknown"), "Caf\u00e9")
+
+    def test_extract_link_from_text(self):
+        """Test extracting the first HTTP/HTTPS link from a decoded body"""
+        import email_monitor
+        
+        text = 'Hello, <a href="https://example.com/first?a=1">click</a> or http://example.org/second'
+        self.assertEqual(email_monitor.extract_link_from_text(text), "https://example.com/first?a=1")
+        self.assertEqual(email_monitor.extract_link_from_text("See [https://example.com/x] now"), "https://example.com/x")
+
+    def test_extract_link_from_text_no_link(self):
+        """Test that a body without an HTTP/HTTPS link yields None"""
+        import email_monitor
+        
+        self.assertIsNone(email_monitor.extract_link_from_text("No link here, only ftp://example.com/file"))
+
+    def test_build_email_text_unescapes_html_entities(self):
+        """Test that entities in HTML bodies are unescaped so links keep their query strings"""
+        import email_monitor
+        
+        fetched_sections = {
+            'HEADER.FIELDS (SUBJECT FROM)': b'Subject: Hi\r\n\r\n',
+            '1': b'<a href="https://example.com/?a=1&amp;b=2">Open</a>',
+            '2': b'Plain &amp; simple https://example.com/?c=3&amp;d=4',
+        }
+        text_sections = [('1', b'html', b'7bit', 'utf-8'), ('2', b'plain', b'7bit', 'utf-8')]
+        
+        headers, bodies = email_monitor._build_email_text(fetched_sections, text_sections)
+        
+        self.assertEqual(headers['Subject'], "Hi")
+        self.assertEqual(email_monitor.extract_link_from_text(bodies[0]), "https://example.com/?a=1&b=2")
+        # Plain text is taken literally
+        self.assertEqual(bodies[1], "Plain &amp; simple https://example.com/?c=3&amp;d=4")
 
     def test_mark_as_read(self):
         """Test marking an email as read"""
@@ -210,8 +561,8 @@ class TestEmailMonitor(unittest.TestCase):
         
         email_monitor.mark_as_read(mock_mail, email_id, self.test_config, self.mock_logger)
         
-        # Verify the correct flag was set
-        mock_mail.store.assert_called_once_with(email_id, '+FLAGS', '\\Seen')
+        # Verify the correct flag was set by UID
+        mock_mail.uid.assert_called_once_with('STORE', email_id, '+FLAGS', '\\Seen')
         # Verify success message was logged
         self.mock_logger.assert_any_call(f"Marked email ID 1 as read in {self.test_config['MAILBOX']}.")
     
@@ -221,21 +572,56 @@ class TestEmailMonitor(unittest.TestCase):
         
         mock_mail = MagicMock()
         email_id = b'1'
-        mock_mail.store.side_effect = Exception("Failed to mark as read")
+        mock_mail.uid.side_effect = Exception("Failed to mark as read")
         
         email_monitor.mark_as_read(mock_mail, email_id, self.test_config, self.mock_logger)
         
         # Verify error message was logged
         self.mock_logger.assert_any_call("Error marking email ID 1 as read: Failed to mark as read")
 
+    def test_mark_emails_as_read_uses_one_store(self):
+        """Test that several emails are marked as read with a single UID STORE"""
+        import email_monitor
+        
+        mock_mail = MagicMock()
+        
+        email_monitor.mark_emails_as_read(mock_mail, [b'3', b'1', '7', 2], self.test_config, self.mock_logger)
+        
+        # Consecutive UIDs are collapsed into a range
+        mock_mail.uid.assert_called_once_with('STORE', b'1:3,7', '+FLAGS', '\\Seen')
+        self.mock_logger.assert_any_call(f"Marked 4 emails as read in {self.test_config['MAILBOX']}: 1:3,7.")
+
+    def test_reconnect_delay_backs_off_exponentially(self):
+        """Test that reconnect attempts back off from the poll interval up to the cap"""
+        import email_monitor
+        
+        self.assertEqual(email_monitor.reconnect_delay(30, 1), 30)
+        self.assertEqual(email_monitor.reconnect_delay(30, 3), 120)
+        self.assertEqual(email_monitor.reconnect_delay(30, 100), email_monitor.RECONNECT_MAX_DELAY_SECONDS)
+
+    def test_processed_uids_evicts_least_recent(self):
+        """Test that the processed UID history is bounded and keyed by int UID"""
+        import email_monitor
+        
+        processed = email_monitor.ProcessedUids(maxsize=2)
+        processed.add(b'1')
+        processed.add('2')
+        # Seeing UID 1 again keeps it, so UID 2 is the oldest when 3 arrives
+        self.assertIn(1, processed)
+        processed.add(b'3')
+        
+        self.assertEqual(list(processed), [1, 3])
+        self.assertNotIn(b'2', processed)
+
     def test_open_link_in_browser(self):
         """Test opening a link in the browser"""
         import email_monitor
         
         test_link = "https://example.com"
+        email_monitor._recent_links.clear()
         
         with patch('webbrowser.open') as mock_open:
-            email_monitor.open_link_in_browser(test_link, self.mock_logger)
+            email_monitor.open_link_in_browser(test_link, self.mock_logger).result(timeout=5)
             
             # Verify webbrowser.open was called with the correct link
             mock_open.assert_called_once_with(test_link, new=2)
@@ -247,12 +633,26 @@ class TestEmailMonitor(unittest.TestCase):
         import email_monitor
         
         test_link = "https://example.com"
+        email_monitor._recent_links.clear()
         
         with patch('webbrowser.open', side_effect=Exception("Failed to open link")):
-            email_monitor.open_link_in_browser(test_link, self.mock_logger)
+            email_monitor.open_link_in_browser(test_link, self.mock_logger).result(timeout=5)
             
             # Verify error message was logged
             self.mock_logger.assert_called_with(f"Error opening link {test_link} in browser: Failed to open link")
 
+    def test_open_link_in_browser_skips_duplicate(self):
+        """Test that the same link is not opened twice in a burst"""
+        import email_monitor
+        
+        test_link = "https://example.com/dup"
+        email_monitor._recent_links.clear()
+        
+        with patch('webbrowser.open') as mock_open:
+            email_monitor.open_link_in_browser(test_link, self.mock_logger).result(timeout=5)
+            self.assertIsNone(email_monitor.open_link_in_browser(test_link, self.mock_logger))
+            
+            mock_open.assert_called_once_with(test_link, new=2)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,14 +1,10 @@
 import unittest
-import sys
-import os
 from unittest.mock import patch, MagicMock, call
 import tkinter as tk
 import threading
 import queue
 import time # Added for TestMonitoringLoop
 
-# Add parent directory to path to import modules to be tested
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 import gui_app
 
 # Helper function to set up mock widgets
@@ -73,7 +69,7 @@ class TestEmailMonitorApp(unittest.TestCase):
         self.app.monitoring_active = False
         self.app.monitoring_thread = None
         self.app.stop_event = threading.Event() # __init__ creates one
-        self.app.processed_email_ids = set() # __init__ creates one
+        self.app.processed_email_ids = gui_app.ProcessedUids() # __init__ creates one
         self.app.log_queue = queue.Queue() # __init__ creates one
 
     def tearDown(self):
@@ -156,6 +152,25 @@ class TestEmailMonitorApp(unittest.TestCase):
             mock_thread.assert_called_once()
             mock_log.assert_called_with("Monitoring started.")
 
+    @patch('gui_app.EmailMonitorApp.update_gui_state')
+    def test_start_monitoring_keeps_processed_ids_for_same_mailbox(self, mock_update_gui):
+        """Test that a restart keeps processed UIDs unless the mailbox changed"""
+        with patch('threading.Thread'):
+            self.app.config_loaded = True
+            self.app.start_monitoring()
+            self.app.processed_email_ids.add(b'42')
+            
+            # Restart on the same mailbox
+            self.app.monitoring_active = False
+            self.app.start_monitoring()
+            self.assertIn(42, self.app.processed_email_ids)
+            
+            # Restart on another mailbox
+            self.app.monitoring_active = False
+            self.app.current_config = dict(self.test_config, MAILBOX="Archive")
+            self.app.start_monitoring()
+            self.assertEqual(len(self.app.processed_email_ids), 0)
+
     @patch('gui_app.SetupWizard')
     @patch('gui_app.tk_messagebox.showwarning')
     def test_start_monitoring_without_config(self, mock_messagebox, mock_wizard):
@@ -203,6 +218,20 @@ class TestEmailMonitorApp(unittest.TestCase):
         mock_log.assert_any_call("Attempting to stop monitoring...")
         mock_log.assert_any_call("Monitoring stopped.")
 
+    @patch('gui_app.EmailMonitorApp.log_message_gui')
+    @patch('gui_app.EmailMonitorApp.update_gui_state')
+    def test_stop_monitoring_interrupts_connection(self, mock_update_gui, mock_log):
+        """Test stop_monitoring shuts down the live IMAP socket so blocking reads return"""
+        self.app.monitoring_active = True
+        self.app.monitoring_thread = MagicMock()
+        self.app.monitoring_thread.is_alive.return_value = False
+        mock_sock = MagicMock()
+        self.app._mail_sock = mock_sock
+        
+        self.app.stop_monitoring()
+        
+        mock_sock.shutdown.assert_called_once_with(gui_app.socket.SHUT_RDWR)
+
     @patch('gui_app.EmailMonitorApp.log_message_gui')
     def test_stop_monitoring_not_active(self, mock_log):
         """Test stop_monitoring when monitoring is not active"""
@@ -356,6 +385,52 @@ class TestEmailMonitorApp(unittest.TestCase):
         # Assertions
         mock_log.assert_any_call("Setup wizard was cancelled.")
 
+    def test_tray_icon_setup_deferred_until_idle(self):
+        """Test that the tray icon is set up after the main window is idle, not during __init__"""
+        self.mock_setup_tray.assert_not_called()
+        self.root.after_idle.assert_called_once_with(self.app.setup_tray_icon)
+        self.assertIsNone(self.app.tray_icon)
+
+    def test_log_message_gui_from_worker_thread_does_not_call_tk(self):
+        """Test that messages from other threads wake the GUI via the notifier thread"""
+        # Stop the mock so we can test the actual implementation
+        self.patch_log_message_gui.stop()
+        calling_threads = []
+        self.root.event_generate.side_effect = lambda *args, **kwargs: calling_threads.append(threading.current_thread().name)
+        
+        worker = threading.Thread(target=self.app.log_message_gui, args=("from worker",), name="worker")
+        worker.start()
+        worker.join(timeout=1)
+        for _ in range(100):
+            if calling_threads:
+                break
+            time.sleep(0.01)
+        
+        self.assertEqual(calling_threads, ["log-notifier"])
+        self.assertEqual(self.app.log_queue.get_nowait(), "from worker")
+
+    def test_worker_logging_does_not_block_while_main_thread_joins_it(self):
+        """Test that a worker logging during Stop's join can finish without the main loop"""
+        # Stop the mock so we can test the actual implementation
+        self.patch_log_message_gui.stop()
+        main_loop_free = threading.Event()
+        
+        def event_generate(*args, **kwargs):
+            # Like tkinter, a call from another thread waits until the main loop serves it
+            if threading.current_thread() is not threading.main_thread():
+                main_loop_free.wait(timeout=2)
+        self.root.event_generate.side_effect = event_generate
+        
+        # The main thread is "busy" joining the worker, as stop_monitoring does
+        worker = threading.Thread(target=self.app.log_message_gui, args=("Monitoring loop finished.",))
+        worker.start()
+        worker.join(timeout=1)
+        worker_finished = not worker.is_alive()
+        main_loop_free.set()
+        
+        self.assertTrue(worker_finished)
+        self.assertEqual(self.app.log_queue.get_nowait(), "Monitoring loop finished.")
+
     def test_log_message_gui(self):
         """Test log_message_gui puts message in queue"""
         # Setup
@@ -429,6 +504,64 @@ class TestEmailMonitorApp(unittest.TestCase):
         self.app.hide_to_tray.assert_not_called()
 
 
+    def test_check_log_queue_inserts_batch_once(self):
+        """Test that all queued log messages are written with a single insert"""
+        # Stop the mock so we can test the actual implementation
+        self.patch_check_log_queue.stop()
+        for message in ("first", "second", "third"):
+            self.app.log_queue.put(message)
+        
+        self.app.check_log_queue()
+        
+        self.app.log_text.insert.assert_called_once()
+        inserted = self.app.log_text.insert.call_args[0][1]
+        self.assertEqual([line.split("] ", 1)[1] for line in inserted.splitlines()], ["first", "second", "third"])
+        # Draining is driven by <<LogMessage>> events, not a timer
+        self.root.after.assert_not_called()
+
+    @patch('gui_app.time.strftime', return_value="12:00:00")
+    def test_check_log_queue_formats_timestamp_once_per_second(self, mock_strftime):
+        """Test that drains within the same second reuse the formatted timestamp"""
+        # Stop the mock so we can test the actual implementation
+        self.patch_check_log_queue.stop()
+        self.app.log_text.index.return_value = "3.0"
+        
+        with patch('gui_app.time.time', return_value=1000.2):
+            for message in ("first", "second"):
+                self.app.log_queue.put(message)
+                self.app.check_log_queue()
+        
+        mock_strftime.assert_called_once()
+        self.assertTrue(self.app.log_text.insert.call_args[0][1].startswith("[12:00:00] second"))
+
+    def test_log_message_gui_generates_one_event_per_drain(self):
+        """Test that queued messages wake the GUI thread with a single event until drained"""
+        # Stop the mocks so we can test the actual implementation
+        self.patch_log_message_gui.stop()
+        self.patch_check_log_queue.stop()
+        self.root.event_generate.reset_mock()
+        
+        self.app.log_message_gui("first")
+        self.app.log_message_gui("second")
+        self.root.event_generate.assert_called_once_with("<<LogMessage>>", when="tail")
+        
+        self.app.check_log_queue()
+        self.app.log_message_gui("third")
+        self.assertEqual(self.root.event_generate.call_count, 2)
+
+    def test_check_log_queue_caps_log_lines(self):
+        """Test that the oldest log lines are dropped beyond MAX_LOG_LINES"""
+        # Stop the mock so we can test the actual implementation
+        self.patch_check_log_queue.stop()
+        self.app.log_queue.put("new message")
+        # Five lines more than the cap, plus the empty line after the trailing newline
+        self.app.log_text.index.return_value = f"{gui_app.MAX_LOG_LINES + 6}.0"
+        
+        self.app.check_log_queue()
+        
+        self.app.log_text.delete.assert_called_once_with('1.0', '6.0')
+
+
 class TestMonitoringLoop(unittest.TestCase):
     """Unit tests for the monitoring loop functionality"""
 
@@ -461,7 +594,7 @@ class TestMonitoringLoop(unittest.TestCase):
         self.patch_is_config_valid = patch('gui_app.EmailMonitorApp._is_config_valid', return_value=True)
         self.mock_is_config_valid = self.patch_is_config_valid.start()
         
-        # Patch log_message_gui for the __init__ call, will be overridden for tests by self.capture_log
+        # Patch log_message_gui for the __init__ call, will be overridden for tests by self.log_messages.append
         self.patch_log_gui_for_init = patch('gui_app.EmailMonitorApp.log_message_gui')
         self.mock_log_gui_for_init = self.patch_log_gui_for_init.start()
         
@@ -478,13 +611,13 @@ class TestMonitoringLoop(unittest.TestCase):
         self.patch_update_gui.stop()
             
         # Override log_message_gui for test purposes AFTER app initialization
-        self.app.log_message_gui = self.capture_log
+        self.app.log_message_gui = self.log_messages.append
 
         # Ensure essential non-widget attributes are set
         self.app.monitoring_active = False
         self.app.monitoring_thread = None
         self.app.stop_event = threading.Event()
-        self.app.processed_email_ids = set()
+        self.app.processed_email_ids = gui_app.ProcessedUids()
         self.app.log_queue = queue.Queue() # Real queue, but check_log_queue is mocked
 
     def tearDown(self):
@@ -502,10 +635,6 @@ class TestMonitoringLoop(unittest.TestCase):
             if self.app.monitoring_thread.is_alive():
                 self.app.monitoring_thread.join(timeout=0.1)
 
-    def capture_log(self, message):
-        """Capture log messages for testing"""
-        self.log_messages.append(message)
-
     @patch('gui_app.connect_to_gmail')
     def test_monitoring_loop_connect_failure(self, mock_connect):
         """Test monitoring loop when connection fails"""
@@ -580,7 +709,152 @@ class TestMonitoringLoop(unittest.TestCase):
         mock_connect.assert_called_with(self.test_config, logger=self.app.log_message_gui)
         mock_search.assert_called_with(mock_mail, self.test_config, logger=self.app.log_message_gui)
         # Verify email was not fetched (since it was already processed)
-        mock_mail.fetch.assert_not_called()
+        mock_mail.uid.assert_not_called()
+
+    @patch('gui_app.idle_wait')
+    @patch('gui_app.connect_to_gmail')
+    @patch('gui_app.em_search_emails')
+    def test_monitoring_loop_uses_idle_when_supported(self, mock_search, mock_connect, mock_idle_wait):
+        """Test that the loop stays connected and waits in IDLE instead of polling"""
+        mock_mail = MagicMock()
+        mock_mail.capabilities = ('IMAP4REV1', 'IDLE')
+        mock_connect.return_value = mock_mail
+        mock_search.return_value = []
+        # First IDLE reports new mail, the second one is interrupted by the stop request
+        def idle_then_stop(*args, **kwargs):
+            if mock_idle_wait.call_count > 1:
+                self.app.stop_event.set()
+                return False
+            return True
+        mock_idle_wait.side_effect = idle_then_stop
+        
+        self.app.stop_event.clear()
+        self.app._monitoring_loop()
+        
+        # One connection, one search before IDLE and one after the notification
+        mock_connect.assert_called_once()
+        self.assertEqual(mock_search.call_count, 2)
+        self.assertEqual(mock_idle_wait.call_args.kwargs['stop_event'], self.app.stop_event)
+        self.assertIn("Server supports IDLE", " ".join(self.log_messages))
+
+    @patch('gui_app.idle_wait', return_value=False)
+    @patch('gui_app.open_link_in_browser')
+    @patch('gui_app.fetch_emails_text')
+    @patch('gui_app.connect_to_gmail')
+    @patch('gui_app.em_search_emails')
+    def test_monitoring_loop_idle_retries_failed_fetch(self, mock_search, mock_connect, mock_fetch,
+                                                       mock_open_link, mock_idle_wait):
+        """Test that an email whose fetch failed is retried when IDLE times out, without new mail"""
+        import email_monitor
+        headers = email_monitor._HEADER_PARSER.parsebytes(b'Subject: test_keyword\r\n\r\n')
+        mock_mail = MagicMock()
+        mock_mail.capabilities = ('IMAP4REV1', 'IDLE')
+        mock_connect.return_value = mock_mail
+        mock_search.return_value = [b'1']
+        # The first fetch fails, the retry succeeds and opening its link ends the test
+        mock_fetch.side_effect = [{}, {b'1': (headers, ["https://example.com/1"])}]
+        mock_open_link.side_effect = lambda *args, **kwargs: self.app.stop_event.set()
+        
+        self.app.stop_event.clear()
+        self.app._monitoring_loop()
+        
+        # One IDLE timeout, then the email is searched for and fetched again
+        self.assertEqual(mock_idle_wait.call_count, 1)
+        self.assertEqual(mock_search.call_count, 2)
+        self.assertIn(b'1', self.app.processed_email_ids)
+
+    @patch('gui_app.connect_to_gmail')
+    @patch('gui_app.em_search_emails')
+    def test_monitoring_loop_keeps_connection_between_polls(self, mock_search, mock_connect):
+        """Test that polling reuses one connection and reconnects only after it drops"""
+        mock_mail = MagicMock()
+        mock_mail.capabilities = ('IMAP4REV1',)
+        mock_connect.return_value = mock_mail
+        # Poll twice, lose the connection on the third search, then stop after reconnecting
+        def search_side_effect(*args, **kwargs):
+            if mock_search.call_count == 3:
+                raise gui_app.imaplib.IMAP4.abort("connection reset")
+            if mock_search.call_count == 4:
+                self.app.stop_event.set()
+            return []
+        mock_search.side_effect = search_side_effect
+        
+        self.app.stop_event.clear()
+        self.app._monitoring_loop()
+        
+        self.assertEqual(mock_connect.call_count, 2)
+        self.assertEqual(mock_mail.logout.call_count, 2)
+        self.assertIn("IMAP connection aborted: connection reset", " ".join(self.log_messages))
+
+    @patch('gui_app.reconnect_delay', return_value=0.01)
+    @patch('gui_app.connect_to_gmail')
+    @patch('gui_app.em_search_emails')
+    def test_monitoring_loop_backs_off_on_repeated_aborts(self, mock_search, mock_connect, mock_delay):
+        """Test that a server that accepts LOGIN but keeps aborting is not reconnected in a tight loop"""
+        mock_mail = MagicMock()
+        mock_mail.capabilities = ('IMAP4REV1',)
+        mock_connect.return_value = mock_mail
+        # The first search succeeds, then every search on a new connection aborts
+        def search_side_effect(*args, **kwargs):
+            if mock_search.call_count == 5:
+                self.app.stop_event.set()
+            if mock_search.call_count > 1:
+                raise gui_app.imaplib.IMAP4.abort("connection reset")
+            return []
+        mock_search.side_effect = search_side_effect
+        
+        self.app.stop_event.clear()
+        self.app._monitoring_loop()
+        
+        # The first drop reconnects at once, later ones wait longer each time
+        self.assertEqual(mock_delay.call_args_list, [call(0.01, 1), call(0.01, 2)])
+        self.assertIn("IMAP connection aborted: connection reset. Reconnecting in 0.01 seconds...", self.log_messages)
+
+    @patch('gui_app.open_link_in_browser')
+    def test_process_single_email_opens_link(self, mock_open_link):
+        """Test that a matching email's first link is opened and the email recorded as processed"""
+        import email_monitor
+        headers = email_monitor._HEADER_PARSER.parsebytes(
+            b'Subject: =?utf-8?q?test=5Fkeyword_inside?=\r\nFrom: sender@example.com\r\n\r\n')
+        bodies = ["Open https://example.com/plain\r\n"]
+        mock_mail = MagicMock()
+        
+        self.app._process_single_email(mock_mail, b'1', '1', (headers, bodies))
+        
+        mock_open_link.assert_called_once_with("https://example.com/plain", logger=self.app.log_message_gui)
+        self.assertIn(b'1', self.app.processed_email_ids)
+        self.assertIn("Subject: test_keyword inside", " ".join(self.log_messages))
+
+    @patch('gui_app.open_link_in_browser')
+    def test_process_single_email_trusts_server_side_match(self, mock_open_link):
+        """Test that an email matched by the server is handled even if the fetched text lacks the keyword"""
+        import email_monitor
+        headers = email_monitor._HEADER_PARSER.parsebytes(b'Subject: Weekly digest\r\n\r\n')
+        # e.g. the keyword was only in the HTML alternative, which is not fetched
+        bodies = ["Read more at https://example.com/digest"]
+        mock_mail = MagicMock()
+        
+        self.app._process_single_email(mock_mail, b'2', '2', (headers, bodies))
+        
+        mock_open_link.assert_called_once_with("https://example.com/digest", logger=self.app.log_message_gui)
+
+    @patch('gui_app.mark_emails_as_read')
+    @patch('gui_app.open_link_in_browser')
+    @patch('gui_app.fetch_emails_text')
+    @patch('gui_app.em_search_emails')
+    def test_check_for_new_emails_marks_batch_read_once(self, mock_search, mock_fetch, mock_open_link, mock_mark_read):
+        """Test that all processed emails are marked as read with a single call"""
+        import email_monitor
+        headers = email_monitor._HEADER_PARSER.parsebytes(b'Subject: test_keyword\r\n\r\n')
+        mock_search.return_value = [b'1', b'2', b'3']
+        # b'2' failed to fetch, so it must not be marked as read
+        mock_fetch.return_value = {b'1': (headers, ["https://example.com/1"]), b'3': (headers, ["no link"])}
+        mock_mail = MagicMock()
+        
+        self.app._check_for_new_emails(mock_mail)
+        
+        mock_mark_read.assert_called_once_with(mock_mail, [b'3', b'1'], self.test_config, logger=self.app.log_message_gui)
+        self.assertEqual(set(self.app.processed_email_ids), {1, 3})
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
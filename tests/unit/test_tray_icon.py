@@ -1,11 +1,8 @@
 import unittest
-import sys
-import os
+import struct
+import zlib
 from unittest.mock import patch, MagicMock, call
-import tkinter as tk
 
-# Add parent directory to path to import modules to be tested
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 import gui_app
 
 # Helper function to set up mock widgets - copied from test_email_monitor_app.py for consistency
@@ -87,8 +84,8 @@ class TestTrayIconFunctionality(unittest.TestCase):
     @patch('gui_app.Image')
     @patch('os.path.exists', return_value=False)
     @patch('threading.Thread')
-    def test_setup_tray_icon_create_dummy(self, mock_thread, mock_exists, mock_image, mock_pystray):
-        """Test creating dummy icon when icon file doesn't exist"""
+    def test_setup_tray_icon_default_icon(self, mock_thread, mock_exists, mock_image, mock_pystray):
+        """Test using the built-in default icon when icon file doesn't exist"""
         # Setup
         mock_image_instance = MagicMock()
         mock_image.new.return_value = mock_image_instance
@@ -101,10 +98,26 @@ class TestTrayIconFunctionality(unittest.TestCase):
         # Call method
         self.app.setup_tray_icon()
         
-        # Assertions
-        mock_image.new.assert_called_once()
-        mock_image_instance.save.assert_called_once_with("icon.png")
-        self.app.log_message_gui.assert_any_call("'icon.png' not found. Created a dummy icon. Replace with your desired icon.")
+        # Assertions: the embedded PNG is decoded in memory and nothing is written to disk
+        icon_data = mock_image.open.call_args[0][0].getvalue()
+        self.assertTrue(icon_data.startswith(b'\x89PNG\r\n\x1a\n'))
+        # Image.open is lazy, so decode the PNG here: every chunk CRC must match
+        # and the pixel data must inflate completely to a 64x64 RGB image
+        chunks = {}
+        pos = 8
+        while pos < len(icon_data):
+            length, chunk_type = struct.unpack('>I4s', icon_data[pos:pos + 8])
+            chunk_data = icon_data[pos + 8:pos + 8 + length]
+            crc, = struct.unpack('>I', icon_data[pos + 8 + length:pos + 12 + length])
+            self.assertEqual(crc, zlib.crc32(chunk_type + chunk_data), chunk_type)
+            chunks[chunk_type] = chunk_data
+            pos += 12 + length
+        self.assertEqual(list(chunks), [b'IHDR', b'IDAT', b'IEND'])
+        self.assertEqual(struct.unpack('>IIBB', chunks[b'IHDR'][:10]), (64, 64, 8, 2))
+        self.assertEqual(len(zlib.decompress(chunks[b'IDAT'])), 64 * (1 + 64 * 3))
+        mock_image.new.assert_not_called()
+        mock_image_instance.save.assert_not_called()
+        self.app.log_message_gui.assert_any_call("'icon.png' not found. Using the default icon. Add your own 'icon.png' to replace it.")
     
     @patch('gui_app.PIL_AVAILABLE', False)
     def test_setup_tray_icon_no_pil(self):